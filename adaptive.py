@@ -0,0 +1,66 @@
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def failure_rate_interval(final_values, threshold, confidence=0.95):
+    # Failure rate (%) below threshold and its Agresti-Coull half-width (%), which stays
+    # honest when no (or every) path has failed yet
+    n = final_values.shape[-1]
+    failures = np.sum(final_values < threshold, axis=-1)
+    z = _z(confidence)
+    adjusted = (failures + z ** 2 / 2) / (n + z ** 2)
+    half_width = z * np.sqrt(adjusted * (1 - adjusted) / (n + z ** 2))
+    return failures / n * 100, half_width * 100
+
+def quantile_interval(values, percentile, confidence=0.95):
+    # Percentile along the last axis and the half-width of its distribution-free
+    # order-statistic confidence interval
+    n = values.shape[-1]
+    q = percentile / 100
+    spread = _z(confidence) * np.sqrt(n * q * (1 - q))
+    lower = int(np.clip(np.floor(q * (n - 1) - spread), 0, n - 1))
+    upper = int(np.clip(np.ceil(q * (n - 1) + spread), 0, n - 1))
+    bounds = np.partition(values, [lower, upper], axis=-1)
+    half_width = (np.take(bounds, upper, axis=-1) - np.take(bounds, lower, axis=-1)) / 2
+    return np.percentile(values, percentile, axis=-1), half_width
+
+def simulate_until_converged(simulate_batch, percentiles=(), failure_threshold=None, failure_tolerance=0.5,
+                             quantile_tolerance=0.01, confidence=0.95, batch_size=1000, min_paths=2000,
+                             max_paths=1000000, max_seconds=None):
+    # Calls simulate_batch(n_paths) -> (..., n_paths) values until every tracked estimate is
+    # within tolerance or the path/time budget runs out:
+    #   failure rate - absolute half-width in percentage points (needs failure_threshold)
+    #   percentiles  - half-width relative to the estimate, over all leading positions
+    # Batches grow with the sample (a quarter of the paths so far) so the re-estimation cost
+    # stays logarithmic in the path count while overshooting the needed paths by at most 25%.
+    # Returns the estimates with their achieved half-widths, the values and the stopping state.
+    started = time.perf_counter()
+    values = None
+    n_paths = 0
+
+    while True:
+        batch = simulate_batch(min(max(batch_size, n_paths // 4), max_paths - n_paths))
+        n_paths += batch.shape[-1]
+        values = batch if values is None else np.concatenate([values, batch], axis=-1)
+
+        result = {"percentiles": {}, "percentile_half_widths": {}}
+        converged = True
+        if failure_threshold is not None:
+            rate, half_width = failure_rate_interval(values, failure_threshold, confidence)
+            result["failure_rate"], result["failure_rate_half_width"] = rate, half_width
+            converged &= bool(np.all(half_width <= failure_tolerance))
+        for p in percentiles:
+            value, half_width = quantile_interval(values, p, confidence)
+            result["percentiles"][p], result["percentile_half_widths"][p] = value, half_width
+            converged &= bool(np.all(half_width <= quantile_tolerance * np.abs(value)))
+
+        elapsed = time.perf_counter() - started
+        out_of_budget = n_paths >= max_paths or (max_seconds is not None and elapsed >= max_seconds)
+        if (converged and n_paths >= min_paths) or out_of_budget:
+            result.update(values=values, paths=n_paths, converged=converged, confidence=confidence, elapsed=elapsed)
+            return result
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import bootstrap_checkpoints
+from factor_model import factor_monte_carlo_simulation, fit_factor_model
+from gbm import TRADING_DAYS, simulate_asset_growth, simulate_checkpoints, simulate_paths, year_marker_days
+from momentum import simulate_momentum_strategy
+from pie import monte_carlo_simulation
+
+# Problem-size grids swept by each suite; every case runs on synthetic inputs only
+SUITES = {
+    "quick": {"paths": [1000, 10000], "years": [1, 10], "assets": [5, 50]},
+    "full": {"paths": [1000, 10000, 100000, 1000000], "years": [1, 10, 40], "assets": [5, 50, 500]},
+}
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # Cases estimated to need more working memory than this are skipped
+
+
+def synthetic_market(n_assets, seed=0):
+    # Daily mean returns and a positive-definite covariance from a 3-factor model, roughly equity-like
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0.0, 0.006, size=(n_assets, 3))
+    idiosyncratic = rng.uniform(0.005, 0.015, size=n_assets) ** 2
+    return rng.normal(0.0004, 0.0002, size=n_assets), loadings @ loadings.T + np.diag(idiosyncratic)
+
+def synthetic_history(n_days, seed=0):
+    # Daily portfolio log returns for the bootstrap engine
+    return np.random.default_rng(seed).normal(0.0003, 0.01, size=n_days)
+
+def _pie(paths, T, n_assets, mode, out):
+    mean, cov = synthetic_market(n_assets)
+    scheme = mode if mode in ("plain", "antithetic", "sobol") else "plain"
+    dtype = np.float32 if mode == "float32" else np.float64
+    return monte_carlo_simulation(mean, cov, np.full(n_assets, 1 / n_assets), T, paths, 1.0, seed=0, scheme=scheme,
+                                  dtype=dtype, out=out if mode == "memmap" else None)
+
+def _factor(paths, T, n_assets, mode, out):
+    mean, cov = synthetic_market(n_assets)
+    history = np.random.default_rng(0).multivariate_normal(mean, cov, size=2 * TRADING_DAYS, method="cholesky")
+    model = fit_factor_model(history, min(3, n_assets - 1))
+    return factor_monte_carlo_simulation(model, np.full(n_assets, 1 / n_assets), T, paths, 1.0, seed=0, scheme=mode)
+
+def _gbm_checkpoints(paths, T, n_assets, mode, out):
+    checkpoints = year_marker_days(np.arange(0, T // TRADING_DAYS + 1), T)
+    return simulate_checkpoints(0.0003, 0.01, T, checkpoints, paths, rng=np.random.default_rng(0), scheme=mode)
+
+def _gbm_paths(paths, T, n_assets, mode, out):
+    dtype = np.float32 if mode == "float32" else np.float64
+    return simulate_paths(0.0003, 0.01, T, paths, rng=np.random.default_rng(0), dtype=dtype,
+                          out=out if mode == "memmap" else None)
+
+def _asset_growth(paths, T, n_assets, mode, out):
+    mean, cov = synthetic_market(n_assets)
+    horizons = np.unique(np.linspace(TRADING_DAYS, T, 5).astype(int))
+    return simulate_asset_growth(mean, np.sqrt(np.diag(cov)), horizons, paths, rng=0, scheme=mode)
+
+def _momentum(paths, T, n_assets, mode, out):
+    mean, cov = synthetic_market(n_assets)
+    checkpoints = year_marker_days(np.arange(0, T // TRADING_DAYS + 1), T)
+    return simulate_momentum_strategy(mean, cov, T, checkpoints, paths, rng=np.random.default_rng(0), scheme=mode)
+
+def _bootstrap(paths, T, n_assets, mode, out):
+    checkpoints = year_marker_days(np.arange(0, T // TRADING_DAYS + 1), T)
+    return bootstrap_checkpoints(synthetic_history(26 * TRADING_DAYS), T, checkpoints, paths, method=mode, seed=0)
+
+# engine: (runner, modes, uses the asset dimension, working-memory estimate in bytes for (paths, T, assets, mode))
+ENGINES = {
+    "pie": (_pie, ("plain", "antithetic", "sobol", "float32", "memmap"), True,
+            lambda p, T, n, mode: (0 if mode == "memmap" else 8 * T * p)
+            + (5 if mode == "sobol" else 3) * 8 * min(p, 1000) * T * n),
+    "factor": (_factor, ("plain", "antithetic", "sobol"), True,
+               lambda p, T, n, mode: 8 * T * p + (8 if mode == "sobol" else 3) * 8 * min(p, 1000) * T * 4
+               + 8 * 2 * TRADING_DAYS * n),
+    "gbm_checkpoints": (_gbm_checkpoints, ("plain", "antithetic", "sobol"), False,
+                        lambda p, T, n, mode: 8 * (T // TRADING_DAYS + 1) * p + 3 * 8 * min(p, 10000) * min(T, 252)
+                        if mode == "plain" else 8 * (T // TRADING_DAYS + 1) * p * 4),
+    "gbm_paths": (_gbm_paths, ("float64", "float32", "memmap"), False,
+                  lambda p, T, n, mode: (0 if mode == "memmap" else (4 if mode == "float32" else 8) * T * p)
+                  + 3 * 8 * min(p, 10000) * min(T, 252)),
+    "asset_growth": (_asset_growth, ("plain", "antithetic", "sobol"), True,
+                     lambda p, T, n, mode: 4 * 8 * 5 * p * n),
+    "momentum": (_momentum, ("plain", "antithetic"), True,
+                 lambda p, T, n, mode: 4 * 8 * min(p, 2000) * (2 * T // 21 + 2) * n + 8 * (T // TRADING_DAYS + 1) * p),
+    "bootstrap": (_bootstrap, ("stationary", "moving"), False,
+                  lambda p, T, n, mode: 4 * 8 * min(p, 2000) * T + 8 * (T // TRADING_DAYS + 1) * p),
+}
+
+def benchmark_cases(suite="quick", engines=None):
+    # (engine, mode, paths, years, assets) for every engine, mode and problem size; engines
+    # without an asset dimension run once per (paths, years) with assets recorded as 1
+    grid = SUITES[suite]
+    cases = []
+    for engine in engines or ENGINES:
+        _, modes, uses_assets, _ = ENGINES[engine]
+        for mode in modes:
+            for paths in grid["paths"]:
+                for years in grid["years"]:
+                    for assets in (grid["assets"] if uses_assets else [1]):
+                        cases.append((engine, mode, paths, years, assets))
+    return cases
+
+def case_key(result):
+    return f"{result['engine']}/{result['mode']}/paths={result['paths']}/years={result['years']}/assets={result['assets']}"
+
+def run_case(engine, mode, paths, years, assets, repeat=3, max_bytes=DEFAULT_MAX_BYTES, min_duration=0.2):
+    # Peak traced memory from one run under tracemalloc (which also warms caches), then wall
+    # time over at least `repeat` untraced runs, repeated until they add up to min_duration
+    # seconds so millisecond cases get enough samples for the best time to be stable.
+    # Disk-backed modes write to a temporary .npy file.
+    runner, _, _, estimate_bytes = ENGINES[engine]
+    T = years * TRADING_DAYS
+    result = {"engine": engine, "mode": mode, "paths": paths, "years": years, "assets": assets,
+              "estimated_bytes": int(estimate_bytes(paths, T, assets, mode))}
+    if result["estimated_bytes"] > max_bytes:
+        result["skipped"] = "estimated memory above limit"
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "paths.npy")
+        tracemalloc.start()
+        runner(paths, T, assets, mode, out)
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        wall_times = []
+        while len(wall_times) < repeat or sum(wall_times) < min_duration:
+            start = time.perf_counter()
+            runner(paths, T, assets, mode, out)
+            wall_times.append(time.perf_counter() - start)
+
+    result["wall_time"] = min(wall_times)
+    result["median_wall_time"] = statistics.median(wall_times)
+    result["timed_runs"] = len(wall_times)
+    result["paths_per_sec"] = paths / result["wall_time"]
+    return result
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def run_suite(suite="quick", engines=None, repeat=3, max_bytes=DEFAULT_MAX_BYTES, verbose=True, min_duration=0.2):
+    results = []
+    for case in benchmark_cases(suite, engines):
+        result = run_case(*case, repeat=repeat, max_bytes=max_bytes, min_duration=min_duration)
+        results.append(result)
+        if verbose:
+            if "skipped" in result:
+                print(f"{case_key(result)}: skipped ({result['skipped']})")
+            else:
+                print(f"{case_key(result)}: {result['wall_time']:.4f}s, {result['paths_per_sec']:,.0f} paths/s, "
+                      f"peak {result['peak_bytes'] / 1024 ** 2:.1f} MiB")
+    return {"suite": suite, "environment": environment(), "results": results}
+
+def save_results(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare(report, baseline, time_tolerance=0.25, memory_tolerance=0.10, min_wall_time=0.01):
+    # One row per case measured in both runs; a case regresses when its best wall time or
+    # peak memory exceeds the baseline by more than the relative tolerance. Cases under
+    # min_wall_time seconds in both runs are too short for timer noise to be told apart from a
+    # slowdown, so only their memory is compared.
+    baseline_results = {case_key(r): r for r in baseline["results"] if "skipped" not in r}
+    rows = []
+    for result in report["results"]:
+        key = case_key(result)
+        if "skipped" in result or key not in baseline_results:
+            continue
+        base = baseline_results[key]
+        time_ratio = result["wall_time"] / base["wall_time"]
+        memory_ratio = result["peak_bytes"] / max(base["peak_bytes"], 1)
+        rows.append({"case": key, "wall_time": result["wall_time"], "baseline_wall_time": base["wall_time"],
+                     "time_ratio": time_ratio, "peak_bytes": result["peak_bytes"],
+                     "baseline_peak_bytes": base["peak_bytes"], "memory_ratio": memory_ratio,
+                     "regression": ((time_ratio > 1 + time_tolerance
+                                     and max(result["wall_time"], base["wall_time"]) >= min_wall_time)
+                                    or memory_ratio > 1 + memory_tolerance)})
+    return pd.DataFrame(rows, columns=["case", "wall_time", "baseline_wall_time", "time_ratio", "peak_bytes",
+                                       "baseline_peak_bytes", "memory_ratio", "regression"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation throughput and memory benchmarks")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), help="Only run these engines")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (the best is reported)")
+    parser.add_argument("--max-bytes", type=float, default=DEFAULT_MAX_BYTES,
+                        help="Skip cases estimated to need more working memory than this")
+    parser.add_argument("--output", help="Write the results as JSON (usable as a later baseline)")
+    parser.add_argument("--baseline", help="Compare against a previously saved results file")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.10)
+    parser.add_argument("--min-wall-time", type=float, default=0.01,
+                        help="Ignore time ratios of cases faster than this (seconds) in both runs")
+    parser.add_argument("--min-duration", type=float, default=0.2,
+                        help="Repeat each case until its timed runs add up to this many seconds")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.suite, args.engines, repeat=args.repeat, max_bytes=args.max_bytes,
+                       min_duration=args.min_duration)
+    if args.output is not None:
+        save_results(report, args.output)
+    if args.baseline is None:
+        return 0
+
+    comparison = compare(report, load_results(args.baseline), args.time_tolerance, args.memory_tolerance,
+                         args.min_wall_time)
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+        print(comparison.round(3))
+    regressions = comparison[comparison["regression"]]
+    print(f"{len(regressions)} of {len(comparison)} cases regressed")
+    return 1 if len(regressions) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
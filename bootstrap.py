@@ -0,0 +1,64 @@
+import numpy as np
+
+
+BOOTSTRAP_METHODS = ("stationary", "moving")
+
+def block_indices(n_history, T, n_paths, block_length=20, method="stationary", rng=None):
+    # (n_paths, T) row indices into an n_history-row return history, drawn in bulk:
+    #   moving     - consecutive blocks of exactly block_length rows from uniform start rows
+    #   stationary - Politis-Romano: a new uniform start with probability 1 / block_length each
+    #                day (geometric block lengths), wrapping circularly at the end of the history
+    rng = np.random.default_rng(rng)
+    if method == "moving":
+        n_blocks = -(-T // block_length)
+        starts = rng.integers(0, n_history - block_length + 1, size=(n_paths, n_blocks))
+        offsets = np.arange(block_length)
+        return (starts[:, :, np.newaxis] + offsets).reshape((n_paths, -1))[:, :T]
+    if method != "stationary":
+        raise ValueError(f"Unknown bootstrap method '{method}', expected one of {BOOTSTRAP_METHODS}")
+
+    days = np.arange(T)
+    new_block = rng.random(size=(n_paths, T)) < 1 / block_length
+    new_block[:, 0] = True
+    starts = rng.integers(0, n_history, size=(n_paths, T))
+    block_start_day = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    block_start_row = np.take_along_axis(starts, block_start_day, axis=1)
+    return (block_start_row + days - block_start_day) % n_history
+
+def bootstrap_returns(history, T, n_paths, block_length=20, method="stationary", rng=None):
+    # Resampled (n_paths, T, ...) returns gathered from a contiguous (rows, ...) history array
+    history = np.ascontiguousarray(history, dtype=float)
+    return history[block_indices(len(history), T, n_paths, block_length, method, rng)]
+
+def bootstrap_simulation(returns, weights, T, mc_sims, initialPortfolio, block_length=20, method="stationary",
+                         block_size=1000, seed=None):
+    # Block-bootstrap counterpart of pie.monte_carlo_simulation: same (T, mc_sims) output, but daily
+    # returns are resampled from the historical (simple) returns instead of drawn from a normal.
+    # Weights are fixed, so the history collapses to one portfolio-return column before resampling.
+    rng = np.random.default_rng(seed)
+    history = np.asarray(returns, dtype=float)
+    history = np.ascontiguousarray(history[~np.isnan(history).any(axis=1)] @ np.asarray(weights, dtype=float))
+
+    portfolio_sims = np.empty(shape=(T, mc_sims))
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        dailyReturns = bootstrap_returns(history, T, stop - start, block_length, method, rng)
+        portfolio_sims[:, start:stop] = (np.cumprod(dailyReturns + 1, axis=1) * initialPortfolio).T
+
+    return portfolio_sims
+
+def bootstrap_checkpoints(log_returns, time_horizon, checkpoints, simulation_runs, initial_value=1.0, block_length=20,
+                          method="stationary", path_block=2000, seed=None):
+    # Block-bootstrap counterpart of gbm.simulate_checkpoints for a 1-D history of portfolio log
+    # returns; keeps only the checkpoint values, (len(checkpoints), runs)
+    rng = np.random.default_rng(seed)
+    history = np.ascontiguousarray(np.asarray(log_returns, dtype=float))
+    checkpoints = np.asarray(checkpoints)
+    log_values = np.empty(shape=(len(checkpoints), simulation_runs))
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        paths = np.cumsum(bootstrap_returns(history, time_horizon, stop - start, block_length, method, rng), axis=1)
+        log_values[:, start:stop] = paths[:, checkpoints].T
+
+    return initial_value * np.exp(log_values)
@@ -0,0 +1,89 @@
+import numpy as np
+
+from path_storage import allocate_paths, finish_paths, write_paths
+from sampling import NormalSampler
+
+
+def scheduled_flows(T, amount, frequency, start=None, stop=None):
+    # (T,) cash flow per day: amount (positive contributions, negative withdrawals) at the end of every
+    # frequency-th day from start (default: the end of the first period) up to stop
+    flows = np.zeros(T)
+    flows[frequency - 1 if start is None else start:stop:frequency] = amount
+    return flows
+
+def simulate_holdings(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio, rebalance_frequency=None,
+                      rebalance_threshold=None, cash_flows=None, flow_rate=0.0, flow_frequency=252, management_fee=0.0,
+                      transaction_cost=0.0, block_size=1000, seed=None, scheme="plain", sampler=None, out=None, risk=None):
+    # Tracks per-asset holdings on every path instead of compounding a fixed-weight portfolio return
+    # (which is daily rebalancing for free). Each day, for all paths of a block at once:
+    #   1. holdings grow with their asset's return and pay the daily share of management_fee (annual)
+    #   2. cash flows settle: cash_flows[t] (a (T,) schedule, see scheduled_flows) plus, every
+    #      flow_frequency days, flow_rate (annual, negative to withdraw) of the current value.
+    #      Contributions are invested at the target weights, withdrawals sold pro rata.
+    #   3. paths rebalance back to weights every rebalance_frequency days and/or whenever an asset's
+    #      weight drifts more than rebalance_threshold from its target (None disables either trigger)
+    # Every traded dollar costs transaction_cost. A path that runs out of money stays at zero: later
+    # contributions are not invested on it.
+    # Returns the (T, mc_sims) portfolio values after each day's flows; out and risk as in
+    # pie.monte_carlo_simulation.
+    weights = np.asarray(weights, dtype=float)
+    n_assets = len(weights)
+    sampler = NormalSampler(scheme, T, n_assets, rng=seed) if sampler is None else sampler
+    L = np.linalg.cholesky(covMatrix)
+    fee_factor = 1 - management_fee / 252
+    flows = np.zeros(T) if cash_flows is None else np.asarray(cash_flows, dtype=float)
+    rate_days = np.zeros(T, dtype=bool)
+    if flow_rate:
+        rate_days[flow_frequency - 1::flow_frequency] = True
+    calendar_days = np.zeros(T, dtype=bool)
+    if rebalance_frequency:
+        calendar_days[rebalance_frequency - 1::rebalance_frequency] = True
+
+    portfolio_sims = allocate_paths((T, mc_sims), out=out)
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        # (paths, T, n) gross growth of each holding per day, fees included
+        growth = (1 + np.asarray(meanReturns) + sampler.draw(stop - start) @ L.T) * fee_factor
+        holdings = np.tile(initialPortfolio * weights, (stop - start, 1))
+        values = np.empty(shape=(T, stop - start))
+        ruined = np.zeros(stop - start, dtype=bool)
+        for t in range(T):
+            holdings *= growth[:, t]
+            value = holdings.sum(axis=1)
+
+            flow = np.full(stop - start, flows[t])
+            if rate_days[t]:
+                flow += flow_rate * flow_frequency / 252 * value
+            if flow.any():
+                contribution = np.where(ruined | (value <= 0), 0, np.maximum(flow, 0))
+                # Withdrawals beyond the remaining value exhaust the path
+                sold = np.minimum(-np.minimum(flow, 0), value)
+                holdings *= np.where(value > 0, 1 - sold / np.where(value > 0, value, 1), 0)[:, np.newaxis]
+                holdings += contribution[:, np.newaxis] * weights
+                value = holdings.sum(axis=1)
+                if transaction_cost:
+                    cost = np.minimum(transaction_cost * (contribution + sold), value)
+                    holdings *= np.where(value > 0, 1 - cost / np.where(value > 0, value, 1), 0)[:, np.newaxis]
+                    value = value - cost
+
+            ruined |= value <= 0
+            holdings[ruined] = 0
+            value[ruined] = 0
+
+            due = np.full(stop - start, calendar_days[t])
+            if rebalance_threshold is not None:
+                drift = np.abs(holdings / np.where(value > 0, value, 1)[:, np.newaxis] - weights).max(axis=1)
+                due |= drift > rebalance_threshold
+            due &= ~ruined
+            if due.any():
+                target = value[due, np.newaxis] * weights
+                cost = transaction_cost * np.abs(target - holdings[due]).sum(axis=1)
+                value[due] -= cost
+                holdings[due] = value[due, np.newaxis] * weights
+            values[t] = value
+
+        write_paths(portfolio_sims, (slice(None), slice(start, stop)), values)
+        if risk is not None:
+            risk.update(values)
+
+    return finish_paths(portfolio_sims)
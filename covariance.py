@@ -0,0 +1,134 @@
+import collections
+
+import numpy as np
+
+
+class CovarianceEstimator:
+    # Mean and covariance of a stream of return rows, updated in O(n^2) per new row from running
+    # weighted moment sums:
+    #   window=None, halflife=None - expanding (all rows so far)
+    #   window=k                   - rolling over the last k rows (the oldest row is subtracted out)
+    #   halflife=h                 - exponentially weighted, each row's weight halving every h rows
+    # shrinkage=True applies Ledoit-Wolf shrinkage towards a scaled identity, using running
+    # third/fourth-moment sums so the optimal intensity is also available without the history.
+    def __init__(self, n_assets, window=None, halflife=None, shrinkage=False):
+        if window is not None and halflife is not None:
+            raise ValueError("Use either a rolling window or an exponential halflife, not both")
+        self.n_assets = n_assets
+        self.window = window
+        self.decay = 1.0 if halflife is None else 0.5 ** (1 / halflife)
+        self.shrinkage = shrinkage
+        self._rows = collections.deque() if window is not None else None
+        self.weight = 0.0  # Sum of row weights
+        self.weight_sq = 0.0  # Sum of squared row weights (for the effective sample size)
+        self.sum = np.zeros(n_assets)
+        self.outer = np.zeros((n_assets, n_assets))
+        if shrinkage:
+            self.sq_outer = np.zeros((n_assets, n_assets))  # sum of x_i^2 x_j
+            self.sq_sq = np.zeros((n_assets, n_assets))  # sum of x_i^2 x_j^2
+
+    def _accumulate(self, x, sign):
+        self.sum += sign * x
+        self.outer += sign * np.outer(x, x)
+        if self.shrinkage:
+            self.sq_outer += sign * np.outer(x * x, x)
+            self.sq_sq += sign * np.outer(x * x, x * x)
+
+    def update(self, row):
+        x = np.asarray(row, dtype=float)
+        if np.isnan(x).any():
+            return self
+        if self.decay != 1.0:
+            self.weight *= self.decay
+            self.weight_sq *= self.decay ** 2
+            for moments in self._moments():
+                moments *= self.decay
+        self._accumulate(x, 1.0)
+        self.weight += 1.0
+        self.weight_sq += 1.0
+        if self._rows is not None:
+            self._rows.append(x)
+            if len(self._rows) > self.window:
+                self._accumulate(self._rows.popleft(), -1.0)
+                self.weight -= 1.0
+                self.weight_sq -= 1.0
+        return self
+
+    def update_many(self, rows):
+        # Bulk version of update for a (rows, assets) history, done with weighted matrix products
+        rows = np.asarray(rows, dtype=float)
+        rows = rows[~np.isnan(rows).any(axis=1)]
+        if self._rows is not None:
+            # Rows older than the window would be subtracted straight back out
+            for x in rows[-self.window:]:
+                self.update(x)
+            return self
+        weights = self.decay ** np.arange(len(rows) - 1, -1, -1)
+        self.weight = self.weight * self.decay ** len(rows) + weights.sum()
+        self.weight_sq = self.weight_sq * self.decay ** (2 * len(rows)) + (weights ** 2).sum()
+        for moments in self._moments():
+            moments *= self.decay ** len(rows)
+        self.sum += weights @ rows
+        self.outer += (rows * weights[:, np.newaxis]).T @ rows
+        if self.shrinkage:
+            squares = rows * rows
+            self.sq_outer += (squares * weights[:, np.newaxis]).T @ rows
+            self.sq_sq += (squares * weights[:, np.newaxis]).T @ squares
+        return self
+
+    def _moments(self):
+        return [self.sum, self.outer] + ([self.sq_outer, self.sq_sq] if self.shrinkage else [])
+
+    def effective_rows(self):
+        return self.weight ** 2 / self.weight_sq if self.weight_sq > 0 else 0.0
+
+    def mean(self):
+        return self.sum / self.weight
+
+    def biased_covariance(self):
+        mean = self.mean()
+        return self.outer / self.weight - np.outer(mean, mean)
+
+    def shrinkage_intensity(self):
+        # Ledoit-Wolf (2004) optimal weight on the scaled-identity target, from the running moments:
+        # the variance of the centered outer products x x^T around S, over ||S - mu I||^2
+        S = self.biased_covariance()
+        mu = np.trace(S) / self.n_assets
+        d2 = np.sum((S - mu * np.eye(self.n_assets)) ** 2)
+        if d2 == 0:
+            return 0.0
+        # E[(x_i - m_i)^2 (x_j - m_j)^2] expanded in raw moments
+        m = self.mean()
+        E_ab = self.outer / self.weight
+        E_a2b = self.sq_outer / self.weight  # E[x_i^2 x_j]
+        E_a2b2 = self.sq_sq / self.weight
+        E_a2 = np.diag(E_ab)
+        mi, mj = m[:, np.newaxis], m[np.newaxis, :]
+        centered = (E_a2b2 - 2 * mj * E_a2b - 2 * mi * E_a2b.T + 4 * mi * mj * E_ab
+                    + mj ** 2 * E_a2[:, np.newaxis] + mi ** 2 * E_a2[np.newaxis, :] - 3 * mi ** 2 * mj ** 2)
+        b2 = min(max(np.sum(centered) - np.sum(S ** 2), 0.0) / self.effective_rows(), d2)
+        return b2 / d2
+
+    def covariance(self):
+        # Bias-corrected covariance (sample covariance for equal weights), shrunk when configured
+        cov = self.biased_covariance()
+        effective = self.effective_rows()
+        if effective > 1:
+            cov = cov * effective / (effective - 1)
+        if self.shrinkage:
+            delta = self.shrinkage_intensity()
+            cov = (1 - delta) * cov + delta * np.trace(cov) / self.n_assets * np.eye(self.n_assets)
+        return cov
+
+def ledoit_wolf(returns):
+    # Batch Ledoit-Wolf shrunk covariance and intensity of a (rows, assets) history, for reference
+    X = np.asarray(returns, dtype=float)
+    X = X[~np.isnan(X).any(axis=1)]
+    Y = X - X.mean(axis=0)
+    T, n = Y.shape
+    S = Y.T @ Y / T
+    mu = np.trace(S) / n
+    d2 = np.sum((S - mu * np.eye(n)) ** 2)
+    b2 = min(np.sum((Y ** 2).T @ (Y ** 2)) / T ** 2 - np.sum(S ** 2) / T, d2)
+    delta = b2 / d2 if d2 > 0 else 0.0
+    return (1 - delta) * S + delta * mu * np.eye(n), delta
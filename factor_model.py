@@ -0,0 +1,115 @@
+import numpy as np
+
+from path_storage import allocate_paths, finish_paths, write_paths
+from result_cache import cache_key
+from sampling import NormalSampler
+
+
+def _centered_history(returns):
+    # Per-asset means and variances over each asset's own observations, and the centered
+    # (days, assets) matrix with missing values at the mean (zero), so assets with shorter
+    # histories keep every row instead of cutting the panel down to the overlapping dates
+    X = np.asarray(returns, dtype=float)
+    X = X[~np.isnan(X).all(axis=1)]
+    mean = np.nanmean(X, axis=0)
+    variance = np.nanvar(X, axis=0, ddof=1)
+    return mean, variance, np.nan_to_num(X - mean)
+
+def fit_factor_model(returns, n_factors, method="pca", iterations=25, min_idiosyncratic=1e-4):
+    # k-factor model of daily returns: cov = B B^T + diag(D), with (assets, k) loadings B on
+    # unit-variance, uncorrelated factors and per-asset idiosyncratic variances D.
+    #   pca         - B from the top k principal components of the return history (one SVD of the
+    #                 (days, assets) matrix, so it also works when assets outnumber days)
+    #   statistical - iterated principal factors: B from the top eigenvectors of S - diag(D),
+    #                 re-estimating D until the fit settles
+    # D is what the factors leave of each asset's variance, floored at min_idiosyncratic of it,
+    # so the model covariance is positive definite even when the sample covariance is not.
+    mean, variance, Y = _centered_history(returns)
+    n_days, n_assets = Y.shape
+    if not 0 < n_factors < min(n_days, n_assets):
+        raise ValueError(f"n_factors must be between 1 and {min(n_days, n_assets) - 1}, got {n_factors}")
+
+    _, s, Vt = np.linalg.svd(Y, full_matrices=False)
+    loadings = Vt[:n_factors].T * s[:n_factors] / np.sqrt(n_days - 1)
+    if method == "statistical":
+        # Subspace iteration on S - diag(D) without forming the (assets, assets) S: each product
+        # is Y^T (Y Q) / (days - 1) - D Q, O(days * assets * k)
+        def reduced_product(Q, idiosyncratic):
+            return Y.T @ (Y @ Q) / (n_days - 1) - idiosyncratic[:, np.newaxis] * Q
+
+        basis = Vt[:n_factors].T
+        for _ in range(iterations):
+            idiosyncratic = np.maximum(variance - np.sum(loadings ** 2, axis=1), min_idiosyncratic * variance)
+            basis, _ = np.linalg.qr(reduced_product(basis, idiosyncratic))
+            eigenvalues, eigenvectors = np.linalg.eigh(basis.T @ reduced_product(basis, idiosyncratic))
+            basis = basis @ eigenvectors
+            loadings = basis * np.sqrt(np.maximum(eigenvalues, 0))
+    elif method != "pca":
+        raise ValueError(f"Unknown factor method '{method}', expected 'pca' or 'statistical'")
+
+    return {
+        "mean": mean,
+        "loadings": loadings,
+        "idiosyncratic_variance": np.maximum(variance - np.sum(loadings ** 2, axis=1), min_idiosyncratic * variance),
+        "n_factors": n_factors,
+        "method": method,
+    }
+
+def cached_fit_factor_model(returns, n_factors, method="pca", cache=None):
+    # fit_factor_model, memoized in a result_cache.ResultCache on the return history and settings
+    if cache is None:
+        return fit_factor_model(returns, n_factors, method)
+    key = cache_key("factor_model", returns, n_factors=n_factors, method=method)
+    model, _ = cache.get_or_compute(key, lambda: (fit_factor_model(returns, n_factors, method), None))
+    return model
+
+def factor_covariance(model):
+    # The full (assets, assets) covariance implied by the model
+    return model["loadings"] @ model["loadings"].T + np.diag(model["idiosyncratic_variance"])
+
+def covariance_loss(model, covMatrix, weights=None):
+    # How much of a full-rank covariance the factor model gives up:
+    #   explained_variance - share of total variance carried by the factors
+    #   frobenius          - ||cov - model cov|| / ||cov||, mostly the correlation structure beyond k factors
+    #   with weights, the portfolio volatility under the full and the factor covariance
+    covMatrix = np.asarray(covMatrix, dtype=float)
+    modelled = factor_covariance(model)
+    loss = {
+        "explained_variance": np.sum(model["loadings"] ** 2) / np.trace(covMatrix),
+        "frobenius": np.linalg.norm(covMatrix - modelled) / np.linalg.norm(covMatrix),
+    }
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        loss["full_volatility"] = np.sqrt(weights @ covMatrix @ weights)
+        loss["factor_volatility"] = np.sqrt(weights @ modelled @ weights)
+    return loss
+
+def factor_asset_returns(model, Z):
+    # (paths, T, assets) asset returns from (paths, T, k + assets) standard normals, at O(assets * k)
+    # per step: mean + B f + sqrt(D) e
+    k = model["n_factors"]
+    return model["mean"] + Z[..., :k] @ model["loadings"].T + Z[..., k:] * np.sqrt(model["idiosyncratic_variance"])
+
+def factor_monte_carlo_simulation(model, weights, T, mc_sims, initialPortfolio, block_size=1000, seed=None,
+                                  scheme="plain", sampler=None, dtype=np.float64, out=None, risk=None):
+    # Factor-model counterpart of pie.monte_carlo_simulation, (T, mc_sims) portfolio paths. For a
+    # fixed-weight portfolio w . (B f + sqrt(D) e) = (B^T w) . f + sqrt(sum w^2 D) * z exactly, so
+    # each step draws k + 1 normals whatever the number of assets.
+    weights = np.asarray(weights, dtype=float)
+    k = model["n_factors"]
+    sampler = NormalSampler(scheme, T, k + 1, rng=seed, dtype=dtype) if sampler is None else sampler
+    portfolio_mean = np.dot(weights, model["mean"]).astype(dtype)
+    factor_loading = (model["loadings"].T @ weights).astype(dtype)
+    idiosyncratic_scale = np.sqrt(np.sum(weights ** 2 * model["idiosyncratic_variance"])).astype(dtype)
+
+    portfolio_sims = allocate_paths((T, mc_sims), dtype=dtype, out=out)
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        Z = sampler.draw(stop - start)
+        dailyReturns = portfolio_mean + Z[..., :k] @ factor_loading + Z[..., k] * idiosyncratic_scale
+        block = (np.cumprod(dailyReturns + 1, axis=1) * initialPortfolio).T
+        write_paths(portfolio_sims, (slice(None), slice(start, stop)), block)
+        if risk is not None:
+            risk.update(block)
+
+    return finish_paths(portfolio_sims)
@@ -0,0 +1,92 @@
+import numpy as np
+
+from path_storage import iter_path_chunks
+
+
+CHUNK_ELEMENTS = 2 ** 22  # Default chunk budget: about 32 MB of float64 values
+
+def _time_major_chunks(paths, chunk_size, time_axis):
+    # (start, stop, (steps, paths) chunk) over blocks of timesteps, so every chunk holds all
+    # paths for its steps and per-step statistics are exact
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_ELEMENTS // paths.shape[1 - time_axis])
+    for start, stop, chunk in iter_path_chunks(paths, chunk_size, axis=time_axis):
+        yield start, stop, chunk if time_axis == 0 else chunk.T
+
+def quantile_bands(paths, percentiles=(5, 25, 50, 75, 95), chunk_size=None, time_axis=0):
+    # (len(percentiles), steps) per-timestep percentiles of a path matrix, computed over blocks of
+    # chunk_size timesteps (default: CHUNK_ELEMENTS values per block); paths may be a memmap
+    n_steps = paths.shape[time_axis]
+    bands = np.empty(shape=(len(percentiles), n_steps))
+    for start, stop, chunk in _time_major_chunks(paths, chunk_size, time_axis):
+        bands[:, start:stop] = np.percentile(chunk, percentiles, axis=1)
+    return bands
+
+def density_raster(paths, bins=200, value_range=None, chunk_size=None, time_axis=0, log=False):
+    # (steps, bins) counts of path values per timestep and value bin, plus the bin edges. Values
+    # outside value_range (default: the overall 0.5th-99.5th percentile band) land in the edge bins.
+    if value_range is None:
+        extremes = quantile_bands(paths, (0.5, 99.5), chunk_size, time_axis)
+        value_range = (extremes[0].min(), extremes[1].max())
+    transform = np.log if log else (lambda x: x)
+    edges = np.linspace(transform(value_range[0]), transform(value_range[1]), bins + 1)
+
+    counts = np.zeros(shape=(paths.shape[time_axis], bins), dtype=np.int64)
+    for start, stop, chunk in _time_major_chunks(paths, chunk_size, time_axis):
+        index = np.clip(np.searchsorted(edges, transform(chunk), side="right") - 1, 0, bins - 1)
+        flat = (np.arange(stop - start)[:, np.newaxis] * bins + index).ravel()
+        counts[start:stop] = np.bincount(flat, minlength=(stop - start) * bins).reshape((stop - start, bins))
+    return counts, (np.exp(edges) if log else edges)
+
+def sample_paths(paths, n_samples=20, time_axis=0, rng=None):
+    # A few randomly chosen paths as a (steps, n_samples) array for overlaying
+    n_paths = paths.shape[1 - time_axis]
+    columns = np.sort(np.random.default_rng(rng).choice(n_paths, size=min(n_samples, n_paths), replace=False))
+    sample = np.asarray(paths[:, columns] if time_axis == 0 else paths[columns])
+    return sample if time_axis == 0 else sample.T
+
+def fan_chart_data(paths, percentiles=(5, 25, 50, 75, 95), density=True, n_samples=20, bins=200, chunk_size=None,
+                   time_axis=0, rng=None):
+    # Everything draw_fan_chart needs, reduced from the paths: sorted percentiles, their bands,
+    # the density raster and bin edges (None without density) and a (steps, n_samples) sample
+    percentiles = sorted(percentiles)
+    # One pass for the bands and the density raster's value range
+    bands = quantile_bands(paths, [0.5, 99.5] + percentiles, chunk_size, time_axis)
+    value_range, bands = (bands[0].min(), bands[1].max()), bands[2:]
+    counts, edges = (density_raster(paths, bins=bins, value_range=value_range, chunk_size=chunk_size, time_axis=time_axis)
+                     if density else (None, None))
+    sample = sample_paths(paths, n_samples, time_axis, rng) if n_samples else None
+    return {"percentiles": percentiles, "bands": bands, "counts": counts, "edges": edges, "sample": sample}
+
+def draw_fan_chart(data, ax=None, color="tab:blue"):
+    # Draws nested percentile bands (outermost palest), the median, optionally a time-value density
+    # raster behind them and a handful of sample paths on top. Only these reductions reach
+    # matplotlib, so the artist count does not depend on the number of paths.
+    import matplotlib.pyplot as plt
+
+    ax = plt.gca() if ax is None else ax
+    percentiles, bands = data["percentiles"], data["bands"]
+    steps = np.arange(bands.shape[1])
+
+    if data["counts"] is not None:
+        counts = data["counts"]
+        # Scale each timestep to its own peak so the spreading distribution stays visible
+        masked = np.ma.masked_equal(counts.T / np.maximum(counts.max(axis=1), 1), 0)
+        ax.pcolormesh(np.arange(len(steps) + 1) - 0.5, data["edges"], masked, cmap="Greys", shading="flat", alpha=0.6)
+
+    n_pairs = len(percentiles) // 2
+    for i in range(n_pairs):
+        ax.fill_between(steps, bands[i], bands[-1 - i], color=color, alpha=0.15 + 0.5 * (i + 1) / (n_pairs + 1),
+                        linewidth=0, label=f"{percentiles[i]:g}th-{percentiles[-1 - i]:g}th Percentile")
+    if len(percentiles) % 2:
+        ax.plot(steps, bands[n_pairs], color="black", linewidth=1.5, label=f"{percentiles[n_pairs]:g}th Percentile")
+
+    if data["sample"] is not None:
+        ax.plot(steps, data["sample"], color="tab:orange", linewidth=0.5, alpha=0.5)
+    ax.legend(loc="upper left")
+    return ax
+
+def plot_fan_chart(paths, percentiles=(5, 25, 50, 75, 95), density=True, n_samples=20, bins=200, chunk_size=None,
+                   time_axis=0, ax=None, rng=None, color="tab:blue"):
+    return draw_fan_chart(fan_chart_data(paths, percentiles, density, n_samples, bins, chunk_size, time_axis, rng),
+                          ax=ax, color=color)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from sampling import NormalSampler
+
+
+def random_weights(n_portfolios, n_assets, rng=None):
+    # Long-only weight vectors drawn uniformly from the simplex, one row per portfolio
+    return np.random.default_rng(rng).dirichlet(np.ones(n_assets), size=n_portfolios)
+
+def portfolio_statistics(terminal_values, initialPortfolio, expected_gain, percentiles=(5, 50, 95), risk_free=0.0):
+    # One row per portfolio from (portfolios, paths) terminal values; returns are over the whole horizon
+    terminal_returns = terminal_values / initialPortfolio - 1
+    expected_return = terminal_returns.mean(axis=1)
+    volatility = terminal_returns.std(axis=1)
+    results = pd.DataFrame({
+        "Expected Return": expected_return,
+        "Volatility": volatility,
+        "Sharpe Ratio": (expected_return - risk_free) / volatility,
+        "Failure Rate (%)": np.mean(terminal_values < initialPortfolio * expected_gain, axis=1) * 100,
+    })
+    for p, values in zip(percentiles, np.percentile(terminal_values, percentiles, axis=1)):
+        results[f"{p}th Percentile ($)"] = values
+    return results
+
+def efficient_frontier(results):
+    # Portfolios no other candidate beats on both expected return and volatility, by volatility
+    ordered = results.sort_values(["Volatility", "Expected Return"], ascending=[True, False])
+    best_so_far = ordered["Expected Return"].cummax()
+    return ordered[ordered["Expected Return"] >= best_so_far]
+
+def sweep_weights(meanReturns, covMatrix, weight_grid, T, mc_sims, initialPortfolio, expected_gain,
+                  percentiles=(5, 50, 95), risk_free=0.0, block_size=50, seed=None, scheme="plain"):
+    # Evaluates every row of weight_grid against one shared set of correlated asset-return paths
+    # (the pie.monte_carlo_simulation model, daily-rebalanced weights). Each block of paths is one
+    # (paths * T, n) @ (n, portfolios) product; block_size bounds that product's size.
+    weight_grid = np.atleast_2d(np.asarray(weight_grid, dtype=float))
+    n_assets = weight_grid.shape[1]
+    sampler = NormalSampler(scheme, T, n_assets, rng=seed)
+    L = np.linalg.cholesky(covMatrix)
+    meanReturns = np.asarray(meanReturns, dtype=float)
+
+    log_growth = np.empty(shape=(len(weight_grid), mc_sims))
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        asset_returns = meanReturns + sampler.draw(stop - start) @ L.T
+        portfolio_returns = asset_returns.reshape((-1, n_assets)) @ weight_grid.T
+        log_growth[:, start:stop] = np.log1p(portfolio_returns).reshape((stop - start, T, -1)).sum(axis=1).T
+
+    return portfolio_statistics(initialPortfolio * np.exp(log_growth), initialPortfolio, expected_gain,
+                                percentiles=percentiles, risk_free=risk_free)
+
+def sweep_buy_and_hold(asset_growth, weight_grid, initialPortfolio, expected_gain, percentiles=(5, 50, 95), risk_free=0.0):
+    # Buy-and-hold portfolios from shared (paths, assets) terminal growth factors, a single GEMM
+    weight_grid = np.atleast_2d(np.asarray(weight_grid, dtype=float))
+    terminal_values = initialPortfolio * (weight_grid @ asset_growth.T)
+    return portfolio_statistics(terminal_values, initialPortfolio, expected_gain,
+                                percentiles=percentiles, risk_free=risk_free)
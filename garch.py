@@ -0,0 +1,135 @@
+import numpy as np
+
+from parallel import run_sharded
+from path_storage import allocate_paths, finish_paths, write_paths
+
+
+def garch_variances(residuals, omega, alpha, beta, initial_variance):
+    # Conditional variances sigma2_t = omega + alpha * e_{t-1}^2 + beta * sigma2_{t-1} of a
+    # (days, assets) residual matrix, run as a first-order linear filter for all assets at once
+    from scipy.signal import lfilter
+
+    residuals = np.atleast_2d(np.asarray(residuals, dtype=float).T).T
+    variances = np.empty_like(residuals)
+    variances[0] = initial_variance
+    for j in range(residuals.shape[1]):
+        drive = omega[j] + alpha[j] * residuals[:-1, j] ** 2
+        variances[1:, j] = lfilter([1.0], [1.0, -beta[j]], drive, zi=[beta[j] * initial_variance[j]])[0]
+    return variances
+
+def _negative_log_likelihood(params, residuals, sample_variance):
+    # Gaussian GARCH(1,1) likelihood with variance targeting (omega = (1 - alpha - beta) * variance);
+    # params are (persistence alpha + beta, share of persistence that is alpha)
+    persistence, share = params
+    alpha, beta = persistence * share, persistence * (1 - share)
+    omega = (1 - persistence) * sample_variance
+    variances = garch_variances(residuals[:, np.newaxis], [omega], [alpha], [beta], [sample_variance])[:, 0]
+    return 0.5 * np.sum(np.log(variances) + residuals ** 2 / variances)
+
+def fit_garch(log_returns):
+    # Per-asset GARCH(1,1) fitted by maximum likelihood to a (days, assets) log-return history,
+    # plus the constant correlation of the standardized residuals. Returns a dict of (assets,)
+    # arrays mu, omega, alpha, beta, the last variance and residual (to start simulations from
+    # today's volatility) and the (assets, assets) correlation matrix.
+    from scipy.optimize import minimize
+
+    history = np.asarray(log_returns, dtype=float)
+    history = history[~np.isnan(history).any(axis=1)]
+    mu = history.mean(axis=0)
+    residuals = history - mu
+    sample_variance = residuals.var(axis=0)
+
+    alpha, beta = np.empty(len(mu)), np.empty(len(mu))
+    for j in range(len(mu)):
+        fit = minimize(_negative_log_likelihood, x0=[0.95, 0.1], args=(residuals[:, j], sample_variance[j]),
+                       method="L-BFGS-B", bounds=[(1e-4, 0.9999), (1e-4, 0.9999)])
+        persistence, share = fit.x
+        alpha[j], beta[j] = persistence * share, persistence * (1 - share)
+    omega = (1 - alpha - beta) * sample_variance
+
+    variances = garch_variances(residuals, omega, alpha, beta, sample_variance)
+    standardized = residuals / np.sqrt(variances)
+    return {
+        "mu": mu, "omega": omega, "alpha": alpha, "beta": beta,
+        "last_variance": variances[-1], "last_residual": residuals[-1],
+        "correlation": np.corrcoef(standardized, rowvar=False).reshape((len(mu), len(mu))),
+    }
+
+def _garch_blocks(params, weights, time_horizon, simulation_runs, path_block, time_block, rng, scheme):
+    # Yields (start, stop, day_start, day_stop, log portfolio values) for every path block and
+    # time block. The variance recursion advances one day at a time for the whole path block;
+    # normals are drawn a time block at a time. The portfolio is rebalanced to weights daily.
+    if scheme not in ("plain", "antithetic"):
+        raise ValueError(f"GARCH simulation supports 'plain' and 'antithetic' sampling, not '{scheme}'")
+    rng = np.random.default_rng(rng)
+    mu, omega, alpha, beta = (np.asarray(params[name], dtype=float) for name in ("mu", "omega", "alpha", "beta"))
+    L = np.linalg.cholesky(params["correlation"])
+    weights = np.asarray(weights, dtype=float)
+    next_variance = omega + alpha * params["last_residual"] ** 2 + beta * params["last_variance"]
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        n_paths = stop - start
+        variance = np.tile(next_variance, (n_paths, 1))
+        residual, asset_returns = np.empty_like(variance), np.empty_like(variance)
+        log_value = np.zeros(n_paths)
+        for day_start in range(0, time_horizon, time_block):
+            day_stop = min(day_start + time_block, time_horizon)
+            # Time-major draws, so each day's (paths, assets) shocks are contiguous
+            if scheme == "antithetic":
+                half = rng.standard_normal(size=(day_stop - day_start, (n_paths + 1) // 2, len(mu)))
+                Z = np.stack([half, -half], axis=2).reshape((day_stop - day_start, -1, len(mu)))[:, :n_paths]
+            else:
+                Z = rng.standard_normal(size=(day_stop - day_start, n_paths, len(mu)))
+            shocks = (Z.reshape((-1, len(mu))) @ L.T).reshape(Z.shape)
+            log_values = np.empty(shape=(day_stop - day_start, n_paths))
+            for t in range(day_stop - day_start):
+                # In-place updates: residual = sigma * shock, then variance = omega + alpha * e^2 + beta * variance
+                np.sqrt(variance, out=residual)
+                residual *= shocks[t]
+                np.add(mu, residual, out=asset_returns)
+                np.expm1(asset_returns, out=asset_returns)
+                log_value += np.log1p(asset_returns @ weights)
+                log_values[t] = log_value
+                variance *= beta
+                variance += omega
+                np.square(residual, out=residual)
+                residual *= alpha
+                variance += residual
+            yield start, stop, day_start, day_stop, log_values.T
+
+def simulate_garch_checkpoints(params, weights, time_horizon, checkpoints, simulation_runs, initial_value=1.0,
+                               path_block=2000, time_block=21, rng=None, scheme="plain"):
+    # GARCH counterpart of gbm.simulate_checkpoints: portfolio values on the checkpoint days,
+    # (len(checkpoints), runs), for correlated per-asset GARCH(1,1) returns started from the
+    # fitted model's current volatility
+    checkpoints = np.asarray(checkpoints)
+    values = np.empty(shape=(len(checkpoints), simulation_runs))
+    for start, stop, day_start, day_stop, log_values in _garch_blocks(params, weights, time_horizon, simulation_runs,
+                                                                      path_block, time_block, rng, scheme):
+        inside = (checkpoints >= day_start) & (checkpoints < day_stop)
+        values[inside, start:stop] = initial_value * np.exp(log_values[:, checkpoints[inside] - day_start].T)
+    return values
+
+def _garch_shard(simulation_runs, seed_sequence, params, weights, time_horizon, checkpoints, initial_value, scheme):
+    return simulate_garch_checkpoints(params, weights, time_horizon, checkpoints, simulation_runs,
+                                      initial_value=initial_value, rng=np.random.default_rng(seed_sequence), scheme=scheme)
+
+def parallel_simulate_garch_checkpoints(params, weights, time_horizon, checkpoints, simulation_runs, initial_value=1.0,
+                                        workers=None, seed=None, scheme="plain"):
+    # Same output as simulate_garch_checkpoints, with paths sharded across a process pool
+    return run_sharded(_garch_shard, simulation_runs,
+                       args=(params, np.asarray(weights, dtype=float), time_horizon, np.asarray(checkpoints),
+                             initial_value, scheme),
+                       workers=workers, seed=seed)
+
+def garch_simulation(params, weights, T, mc_sims, initialPortfolio, block_size=1000, seed=None, scheme="plain",
+                     dtype=np.float64, out=None):
+    # GARCH counterpart of pie.monte_carlo_simulation: (T, mc_sims) portfolio paths, optionally
+    # written block by block to out (an array or a .npy file path)
+    portfolio_sims = allocate_paths((T, mc_sims), dtype=dtype, out=out)
+    for start, stop, day_start, day_stop, log_values in _garch_blocks(params, weights, T, mc_sims, block_size, 21,
+                                                                      seed, scheme):
+        write_paths(portfolio_sims, (slice(day_start, day_stop), slice(start, stop)),
+                    (initialPortfolio * np.exp(log_values)).T)
+    return finish_paths(portfolio_sims)
@@ -0,0 +1,210 @@
+import numpy as np
+
+from adaptive import simulate_until_converged
+from parallel import default_workers, run_sharded, shard_sizes
+from path_storage import allocate_paths, finish_paths, write_paths
+from sampling import NormalSampler, control_variate, estimate, replicate_labels
+
+
+TRADING_DAYS = 252
+
+def year_marker_days(years, time_horizon, trading_days=TRADING_DAYS):
+    # Day index of each year marker, clamped to the last simulated day
+    return np.array([year * trading_days if year * trading_days < time_horizon else time_horizon - 1 for year in years])
+
+def expected_value(daily_mean, daily_volatility, days, initial_value=1.0):
+    # Analytic mean of initial_value * exp(sum of `days` normal(daily_mean, daily_volatility) shocks)
+    return initial_value * np.exp(days * (daily_mean + 0.5 * daily_volatility ** 2))
+
+def simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoints, simulation_runs,
+                         initial_value=1.0, path_block=10000, time_block=TRADING_DAYS, rng=None,
+                         scheme="plain", replicates=8, paths_out=None):
+    # Streams log-normal paths a time block at a time and keeps only the running log-value,
+    # so memory is (path_block x time_block) plus one value per path per checkpoint day.
+    # paths_out (a (simulation_runs, time_horizon) array, e.g. rows of a memmap) also receives
+    # the full daily paths the checkpoints are read from; plain scheme only.
+    # Row k of the result has the distribution of column checkpoints[k] of the dense
+    # exp(cumsum(normal(...))) matrix; the draws are only the same when one block covers the whole
+    # matrix (time_block >= time_horizon and path_block >= simulation_runs), since blocking changes
+    # the order the shocks are taken from the generator.
+    if scheme != "plain":
+        if paths_out is not None:
+            raise ValueError("Daily paths are only simulated with the plain sampling scheme")
+        sampler = NormalSampler(scheme, len(checkpoints), 1, rng=rng, replicates=replicates)
+        return _sample_checkpoints(daily_mean, daily_volatility, checkpoints, simulation_runs, initial_value,
+                                   path_block, sampler)
+
+    rng = np.random if rng is None else rng
+    checkpoints = np.asarray(checkpoints)
+    log_values = np.empty(shape=(len(checkpoints), simulation_runs))
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        log_value = np.zeros(stop - start)
+        for day in range(0, time_horizon, time_block):
+            end = min(day + time_block, time_horizon)
+            shocks = rng.normal(daily_mean, daily_volatility, (stop - start, end - day))
+            in_block = (checkpoints >= day) & (checkpoints < end)
+
+            if paths_out is not None:
+                log_paths = log_value[:, np.newaxis] + np.cumsum(shocks, axis=1)
+                write_paths(paths_out, (slice(start, stop), slice(day, end)),
+                            (initial_value * np.exp(log_paths)).astype(paths_out.dtype))
+                log_values[in_block, start:stop] = log_paths[:, checkpoints[in_block] - day].T
+                log_value = log_paths[:, -1]
+            else:
+                # Sum the shocks between checkpoints instead of materializing the block's cumsum
+                ends = checkpoints[in_block] - day + 1
+                cuts = np.union1d([0], ends[ends < end - day])
+                segment_log_values = log_value[:, np.newaxis] + np.cumsum(np.add.reduceat(shocks, cuts, axis=1), axis=1)
+                log_values[in_block, start:stop] = segment_log_values[:, np.searchsorted(cuts, ends) - 1].T
+                log_value = segment_log_values[:, -1]
+
+    return initial_value * np.exp(log_values)
+
+def simulate_paths(daily_mean, daily_volatility, time_horizon, simulation_runs, initial_value=1.0,
+                   path_block=10000, time_block=TRADING_DAYS, rng=None, dtype=np.float64, out=None):
+    # Full (runs, time_horizon) value paths, the dense initial_value * exp(cumsum(normal(...)))
+    # matrix, filled one (path_block x time_block) chunk at a time. The running log-value stays in
+    # float64; dtype sets the stored precision and out (a file path or array) where it is stored,
+    # so a disk-backed float32 .npy keeps resident memory at one chunk.
+    rng = np.random if rng is None else rng
+    paths = allocate_paths((simulation_runs, time_horizon), dtype=dtype, out=out)
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        log_value = np.zeros(stop - start)
+        for day in range(0, time_horizon, time_block):
+            end = min(day + time_block, time_horizon)
+            log_paths = log_value[:, np.newaxis] + np.cumsum(rng.normal(daily_mean, daily_volatility, (stop - start, end - day)), axis=1)
+            write_paths(paths, (slice(start, stop), slice(day, end)), (initial_value * np.exp(log_paths)).astype(dtype))
+            log_value = log_paths[:, -1]
+
+    return finish_paths(paths)
+
+def _sample_checkpoints(daily_mean, daily_volatility, checkpoints, simulation_runs, initial_value, path_block, sampler):
+    # With constant drift and volatility the sum of the daily shocks between two checkpoints is
+    # exactly normal, so variance-reduced schemes sample one normal per (sorted) checkpoint
+    # interval; Sobol then only needs len(checkpoints) dimensions.
+    checkpoints = np.asarray(checkpoints)
+    order = np.argsort(checkpoints, kind="stable")
+    segment_days = np.diff(checkpoints[order] + 1, prepend=0)
+    log_values = np.empty(shape=(len(checkpoints), simulation_runs))
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        Z = sampler.draw(stop - start)[:, :, 0]
+        shocks = segment_days * daily_mean + np.sqrt(segment_days) * daily_volatility * Z
+        log_values[order, start:stop] = np.cumsum(shocks, axis=1).T
+
+    return initial_value * np.exp(log_values)
+
+def simulate_asset_growth(daily_drift, daily_shock, horizon_days, simulation_runs, path_block=10000,
+                          rng=None, scheme="plain", replicates=8):
+    # Per-asset price growth factors at each horizon, (len(horizon_days), runs, assets), from one
+    # set of independent GBM paths simulated to the longest horizon. Every horizon reads the same
+    # paths (common random numbers); the summed daily log shocks between sorted horizons are
+    # sampled directly, which is exact for constant drift and volatility. Horizons may come in any
+    # order; they are simulated sorted and returned in the order given.
+    horizon_days = np.asarray(horizon_days)
+    if np.any(horizon_days < 0):
+        raise ValueError("Horizons must be non-negative numbers of days")
+    order = np.argsort(horizon_days, kind="stable")
+    segment_days = np.diff(horizon_days[order], prepend=0)[:, np.newaxis]
+    sampler = NormalSampler(scheme, len(horizon_days), len(daily_drift), rng=rng, replicates=replicates)
+    growth = np.empty(shape=(len(horizon_days), simulation_runs, len(daily_drift)))
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        Z = sampler.draw(stop - start)
+        log_prices = np.cumsum(segment_days * daily_drift + np.sqrt(segment_days) * daily_shock * Z, axis=1)
+        growth[order, start:stop] = np.exp(log_prices).transpose(1, 0, 2)
+
+    return growth
+
+def simulate_horizon_returns(daily_drift, daily_shock, weights, horizon_days, simulation_runs, path_block=10000,
+                             rng=None, scheme="plain", replicates=8):
+    # Buy-and-hold portfolio return at each horizon, (len(horizon_days), runs)
+    growth = simulate_asset_growth(daily_drift, daily_shock, horizon_days, simulation_runs, path_block=path_block,
+                                   rng=rng, scheme=scheme, replicates=replicates)
+    return growth @ np.asarray(weights, dtype=float) - 1
+
+def checkpoint_percentiles(checkpoint_values, percentiles=(10, 25, 50, 75, 90)):
+    # {percentile: value at each checkpoint}, matching the year-marker projection tables
+    return {p: np.percentile(checkpoint_values, p, axis=1) for p in percentiles}
+
+def checkpoint_percentile_errors(checkpoint_values, percentiles=(10, 25, 50, 75, 90), labels=None, scheme="plain", replicates=8):
+    # {percentile: standard error at each checkpoint} from the spread across replicate groups
+    labels = replicate_labels(checkpoint_values.shape[1], scheme, replicates) if labels is None else labels
+    return {p: np.array([estimate(row, lambda x: np.percentile(x, p), labels)[1] for row in checkpoint_values])
+            for p in percentiles}
+
+def checkpoint_loss_estimates(checkpoint_values, threshold, control_means=None, labels=None, scheme="plain", replicates=8):
+    # Per checkpoint: the mean and the share of paths below threshold, each with its standard error.
+    # With control_means (the analytic mean of each checkpoint, see expected_value) the share below
+    # threshold is also estimated with the simulated values as a control variate.
+    labels = replicate_labels(checkpoint_values.shape[1], scheme, replicates) if labels is None else labels
+    columns = ["mean", "mean_error", "loss_rate", "loss_rate_error"]
+    if control_means is not None:
+        columns += ["control_mean", "cv_loss_rate", "cv_loss_rate_error"]
+    estimates = {column: np.empty(len(checkpoint_values)) for column in columns}
+
+    for k, row in enumerate(checkpoint_values):
+        estimates["mean"][k], estimates["mean_error"][k] = estimate(row, labels=labels)
+        losses = (row < threshold).astype(float)
+        estimates["loss_rate"][k], estimates["loss_rate_error"][k] = estimate(losses, labels=labels)
+        if control_means is not None:
+            estimates["control_mean"][k] = control_means[k]
+            estimates["cv_loss_rate"][k], estimates["cv_loss_rate_error"][k] = estimate(
+                control_variate(losses, row, control_means[k]), labels=labels)
+
+    return estimates
+
+def _checkpoint_shard(simulation_runs, seed_sequence, daily_mean, daily_volatility, time_horizon, checkpoints, initial_value,
+                      scheme, replicates, paths_file=None, first_path=0):
+    rng = np.random.default_rng(seed_sequence)
+    # Each shard writes its own rows of the shared paths file
+    paths_out = None if paths_file is None else np.load(paths_file, mmap_mode="r+")[first_path:first_path + simulation_runs]
+    values = simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoints, simulation_runs,
+                                  initial_value=initial_value, rng=rng, scheme=scheme, replicates=replicates,
+                                  paths_out=paths_out)
+    if paths_out is not None:
+        paths_out.flush()
+    return values
+
+def parallel_simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoints, simulation_runs,
+                                  initial_value=1.0, workers=None, seed=None, scheme="plain", replicates=8,
+                                  paths_file=None, paths_dtype=np.float32):
+    # Same output as simulate_checkpoints, with paths sharded across a process pool. paths_file
+    # also stores the daily paths behind the checkpoints as a (simulation_runs, time_horizon) .npy
+    # (plain scheme only), so the file and the checkpoint values are one sample.
+    workers = workers or default_workers()
+    per_shard_args = ()
+    if paths_file is not None:
+        if scheme != "plain":
+            raise ValueError("Daily paths are only simulated with the plain sampling scheme")
+        allocate_paths((simulation_runs, time_horizon), dtype=paths_dtype, out=paths_file)
+        sizes = shard_sizes(simulation_runs, workers)
+        per_shard_args = ([paths_file] * workers, np.cumsum([0] + sizes[:-1]).tolist())
+    return run_sharded(_checkpoint_shard, simulation_runs,
+                       args=(daily_mean, daily_volatility, time_horizon, np.asarray(checkpoints), initial_value,
+                             scheme, replicates),
+                       workers=workers, seed=seed, per_shard_args=per_shard_args)
+
+def adaptive_simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoints, initial_value=1.0,
+                                  percentiles=(10, 25, 50, 75, 90), quantile_tolerance=0.01, max_paths=1000000,
+                                  max_seconds=None, batch_size=10000, seed=None, scheme="plain"):
+    # Simulates batches until every percentile at every checkpoint is within quantile_tolerance
+    # (relative) or the budget runs out; "values" holds the (len(checkpoints), paths) sample
+    rng = np.random.default_rng(seed)
+    sampler = NormalSampler(scheme, len(checkpoints), 1, rng=rng) if scheme != "plain" else None
+
+    def simulate_batch(n_paths):
+        if sampler is None:
+            return simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoints, n_paths,
+                                        initial_value=initial_value, rng=rng)
+        return _sample_checkpoints(daily_mean, daily_volatility, checkpoints, n_paths, initial_value,
+                                   n_paths, sampler)
+
+    return simulate_until_converged(simulate_batch, percentiles=percentiles, quantile_tolerance=quantile_tolerance,
+                                    batch_size=batch_size, max_paths=max_paths, max_seconds=max_seconds)
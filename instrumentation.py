@@ -0,0 +1,110 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+
+class JsonLinesSink:
+    # Appends one JSON object per record to a file
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.fspath(path))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+class SamplingProfiler:
+    # Background thread that samples the innermost frame of one thread every `interval`
+    # seconds and counts the (file, function, line) locations it lands on
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                self.counts[f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"] += 1
+
+    def start(self):
+        self.counts.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, top=10):
+        # Most sampled locations as [location, share of samples] pairs
+        self._stop.set()
+        self._thread.join()
+        total = max(sum(self.counts.values()), 1)
+        return [[location, count / total] for location, count in self.counts.most_common(top)]
+
+class Instrumentation:
+    # Times named stages and hands one record per stage to `sink` (any callable taking a dict):
+    # wall and CPU seconds, paths/sec when the stage reports a path count, bytes allocated at the
+    # stage's peak when trace_memory is set (tracemalloc, which slows every allocation in the
+    # stage, so it is off by default), and the hottest sampled lines when profile is set. With enabled=False, stage() returns a no-op context. Stages are not
+    # meant to nest when tracing memory, since each one resets the tracemalloc peak.
+    def __init__(self, sink=None, enabled=True, trace_memory=False, profile=False, profile_interval=0.005, **context):
+        self.sink = sink
+        self.enabled = enabled and sink is not None
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.context = {"run_id": uuid.uuid4().hex[:12], **context}
+
+    def stage(self, name, paths=None, **fields):
+        # Yields a dict; keys added to it inside the block are included in the record
+        if not self.enabled:
+            return contextlib.nullcontext({})
+        return self._record_stage(name, paths, fields)
+
+    @contextlib.contextmanager
+    def _record_stage(self, name, paths, fields):
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        profiler = SamplingProfiler(self.profile_interval) if self.profile else None
+        if profiler is not None:
+            profiler.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        error = None
+        try:
+            yield fields
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            record = {**self.context, "stage": name, "timestamp": time.time(),
+                      "wall_time": wall_time, "cpu_time": time.process_time() - cpu_start}
+            if self.trace_memory:
+                record["allocated_bytes"] = tracemalloc.get_traced_memory()[1] - start_bytes
+                if started_tracing:
+                    tracemalloc.stop()
+            if paths is not None:
+                record["paths"] = paths
+                record["paths_per_sec"] = paths / wall_time if wall_time > 0 else None
+            if profiler is not None:
+                record["profile"] = profiler.stop()
+            if error is not None:
+                record["error"] = error
+            record.update(fields)
+            self.sink(record)
+
+DISABLED = Instrumentation(enabled=False)
@@ -0,0 +1,144 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+
+def _memoized(method):
+    # Caches method(self, *args) in self._cache until the market data changes
+    @functools.wraps(method)
+    def cached(self, *args, **kwargs):
+        key = (method.__name__, tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+               tuple(sorted(kwargs.items())))
+        if key not in self._cache:
+            value = method(self, *args, **kwargs)
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False  # Shared between every caller
+            self._cache[key] = value
+        return self._cache[key]
+    return cached
+
+class MarketData:
+    # An aligned (days, assets) price matrix and the statistics derived from it. Every statistic
+    # is computed on first use from C-contiguous float64 arrays and memoized, so each one is
+    # computed at most once however many stages ask for it; appending new bars clears them all.
+    # The *_array properties and the stats methods return (read-only) arrays; the frame
+    # properties wrap the same arrays with the dates and tickers.
+    def __init__(self, prices, base=None):
+        # base: optional (assets,) prices on the day before the first row, so the first row also
+        # has a return (see from_returns)
+        prices = pd.DataFrame(prices, dtype=float)
+        if prices.isna().to_numpy().any():
+            raise ValueError("MarketData needs an aligned price matrix without missing values")
+        self.prices = prices
+        self.base = None if base is None else np.asarray(base, dtype=float)
+        self.version = 0
+        self._cache = {}
+
+    @classmethod
+    def from_returns(cls, returns):
+        # Market whose simple returns are exactly the given (days, assets) matrix, e.g. synthetic
+        # returns: prices are the growth of 1 from a base of 1 the day before
+        returns = pd.DataFrame(returns, dtype=float)
+        return cls((1 + returns).cumprod(), base=np.ones(returns.shape[1]))
+
+    def append(self, prices):
+        # Adds new bars (same tickers, later dates) and invalidates every cached statistic
+        prices = pd.DataFrame(prices, dtype=float)[self.prices.columns]
+        if prices.isna().to_numpy().any():
+            raise ValueError("MarketData needs an aligned price matrix without missing values")
+        if len(self.prices) and len(prices) and prices.index[0] <= self.prices.index[-1]:
+            raise ValueError("Appended bars must come after the last date already held")
+        self.prices = pd.concat([self.prices, prices])
+        self.version += 1
+        self._cache.clear()
+        return self
+
+    @property
+    def columns(self):
+        return self.prices.columns
+
+    @property
+    def index(self):
+        return self.prices.index
+
+    @_memoized
+    def select(self, columns):
+        # The market restricted to some tickers, with its own cache (cleared along with this one)
+        columns = list(columns)
+        base = None if self.base is None else self.base[self.columns.get_indexer(columns)]
+        return MarketData(self.prices[columns], base=base)
+
+    @property
+    @_memoized
+    def price_array(self):
+        return np.ascontiguousarray(self.prices.to_numpy(dtype=float))
+
+    def _return_index(self):
+        return self.index if self.base is not None else self.index[1:]
+
+    @property
+    @_memoized
+    def simple_return_array(self):
+        prices = self.price_array
+        previous = prices[:-1] if self.base is None else np.vstack([self.base, prices[:-1]])
+        return prices[len(prices) - len(previous):] / previous - 1
+
+    @property
+    @_memoized
+    def log_return_array(self):
+        return np.log1p(self.simple_return_array)
+
+    @property
+    @_memoized
+    def simple_returns(self):
+        return pd.DataFrame(self.simple_return_array, index=self._return_index(), columns=self.columns, copy=False)
+
+    @property
+    @_memoized
+    def log_returns(self):
+        return pd.DataFrame(self.log_return_array, index=self._return_index(), columns=self.columns, copy=False)
+
+    def _returns(self, log):
+        return self.log_return_array if log else self.simple_return_array
+
+    @_memoized
+    def mean_returns(self, log=False):
+        return self._returns(log).mean(axis=0)
+
+    @_memoized
+    def covariance(self, log=False):
+        n_assets = len(self.columns)
+        return np.cov(self._returns(log), rowvar=False).reshape((n_assets, n_assets))
+
+    @_memoized
+    def std(self, log=False):
+        return np.sqrt(np.diag(self.covariance(log=log)))
+
+    @_memoized
+    def cholesky(self, log=False):
+        return np.linalg.cholesky(self.covariance(log=log))
+
+    @property
+    @_memoized
+    def cumulative_returns(self):
+        # Growth of 1 invested at the start (the base, when there is one)
+        start = self.price_array[0] if self.base is None else self.base
+        return pd.DataFrame(self.price_array / start, index=self.index, columns=self.columns, copy=False)
+
+    @property
+    @_memoized
+    def drawdowns(self):
+        prices = self.price_array
+        return pd.DataFrame(prices / np.maximum.accumulate(prices, axis=0) - 1, index=self.index, columns=self.columns,
+                            copy=False)
+
+    @_memoized
+    def rolling_mean(self, window):
+        # window-day moving average of the cumulative returns (NaN until a full window exists),
+        # from one cumulative sum instead of a pass per window
+        growth = self.cumulative_returns.to_numpy()
+        sums = np.vstack([np.zeros(len(self.columns)), np.cumsum(growth, axis=0)])
+        averages = np.full(growth.shape, np.nan)
+        averages[window - 1:] = (sums[window:] - sums[:-window]) / window
+        return pd.DataFrame(averages, index=self.index, columns=self.columns, copy=False)
@@ -0,0 +1,95 @@
+import numpy as np
+
+from parallel import run_sharded
+from sampling import NormalSampler
+
+
+def momentum_weights(signal, momentum_threshold):
+    # Long-only weights proportional to the trailing return of the assets trending above the
+    # threshold; paths with no trending asset fall back to equal weights
+    trending = np.where(signal > momentum_threshold, signal, 0.0)
+    total = trending.sum(axis=-1, keepdims=True)
+    equal = np.full(signal.shape, 1 / signal.shape[-1])
+    return np.where(total > 0, trending / np.where(total > 0, total, 1.0), equal)
+
+def event_grid(time_horizon, checkpoints, lookback_period, rebalance_frequency):
+    # Elapsed-day counts at which prices are needed: rebalances, their lookback starts and the
+    # checkpoints (checkpoint day d is observed after d + 1 daily returns)
+    rebalances = np.arange(rebalance_frequency, time_horizon, rebalance_frequency)
+    lookback_starts = rebalances[rebalances >= lookback_period] - lookback_period
+    grid = np.union1d(np.concatenate([[0], rebalances, lookback_starts, np.asarray(checkpoints) + 1]), [time_horizon])
+    return grid, rebalances
+
+def simulate_momentum_strategy(daily_mean, daily_cov, time_horizon, checkpoints, simulation_runs,
+                               lookback_period=252, momentum_threshold=0.02, rebalance_frequency=21,
+                               initial_value=1.0, path_block=2000, rng=None, scheme="plain", replicates=8,
+                               block_bytes=128 * 1024 ** 2):
+    # Simulates correlated multi-asset GBM paths (daily log returns ~ N(daily_mean, daily_cov)) and
+    # runs the momentum rule inside every path: each rebalance_frequency days the portfolio is
+    # reweighted by the trailing lookback_period log return of each asset (equal weights until a
+    # full lookback exists), and holdings drift with prices in between. Returns the portfolio
+    # values on the checkpoint days, (len(checkpoints), runs).
+    #
+    # Prices are only needed on the event grid, so the summed daily log returns between grid
+    # points are sampled directly (exact for constant parameters). Each block of paths walks the
+    # grid carrying only the current log prices, the last rebalance's and the lookback starts still
+    # ahead; the block's normals are the one (paths, len(grid), assets) array, so path_block is cut
+    # to keep it within block_bytes when the grid is long (e.g. daily rebalancing).
+    daily_mean = np.asarray(daily_mean, dtype=float)
+    n_assets = len(daily_mean)
+    L = np.linalg.cholesky(daily_cov)
+    grid, rebalances = event_grid(time_horizon, checkpoints, lookback_period, rebalance_frequency)
+    position = {day: i for i, day in enumerate(grid)}
+    rebalance_days = set(rebalances)
+    lookback_positions = {position[day - lookback_period] for day in rebalances if day >= lookback_period}
+    steps = np.diff(grid)
+    checkpoint_rows = {}
+    for k, day in enumerate(checkpoints):
+        checkpoint_rows.setdefault(position[day + 1], []).append(k)
+
+    sampler = NormalSampler(scheme, len(steps), n_assets, rng=rng, replicates=replicates)
+    values = np.empty(shape=(len(checkpoints), simulation_runs))
+    path_block = max(1, min(path_block, block_bytes // (len(steps) * n_assets * 8)))
+
+    for start in range(0, simulation_runs, path_block):
+        stop = min(start + path_block, simulation_runs)
+        Z = sampler.draw(stop - start)
+
+        # Portfolio value on every grid point, advanced one grid step at a time
+        log_price = np.zeros((stop - start, n_assets))
+        lookback_log_prices = {}
+        weights = np.full((stop - start, n_assets), 1 / n_assets)
+        anchor_value, anchor_log_price = np.full(stop - start, initial_value), log_price
+        for i in range(len(grid)):
+            if i:
+                log_price = log_price + steps[i - 1] * daily_mean + np.sqrt(steps[i - 1]) * (Z[:, i - 1] @ L.T)
+            value = anchor_value * np.sum(weights * np.exp(log_price - anchor_log_price), axis=1)
+            for k in checkpoint_rows.get(i, ()):
+                values[k, start:stop] = value
+            if i in lookback_positions:
+                lookback_log_prices[grid[i]] = log_price
+            if grid[i] in rebalance_days:
+                if grid[i] >= lookback_period:
+                    signal = log_price - lookback_log_prices.pop(grid[i] - lookback_period)
+                    weights = momentum_weights(signal, momentum_threshold)
+                else:
+                    weights = np.full_like(weights, 1 / n_assets)
+                anchor_value, anchor_log_price = value, log_price
+
+    return values
+
+def _momentum_shard(simulation_runs, seed_sequence, daily_mean, daily_cov, time_horizon, checkpoints,
+                    lookback_period, momentum_threshold, rebalance_frequency, initial_value, scheme):
+    return simulate_momentum_strategy(daily_mean, daily_cov, time_horizon, checkpoints, simulation_runs,
+                                      lookback_period=lookback_period, momentum_threshold=momentum_threshold,
+                                      rebalance_frequency=rebalance_frequency, initial_value=initial_value,
+                                      rng=np.random.default_rng(seed_sequence), scheme=scheme)
+
+def parallel_simulate_momentum_strategy(daily_mean, daily_cov, time_horizon, checkpoints, simulation_runs,
+                                        lookback_period=252, momentum_threshold=0.02, rebalance_frequency=21,
+                                        initial_value=1.0, workers=None, seed=None, scheme="plain"):
+    # Same output as simulate_momentum_strategy, with paths sharded across a process pool
+    return run_sharded(_momentum_shard, simulation_runs,
+                       args=(np.asarray(daily_mean), np.asarray(daily_cov), time_horizon, np.asarray(checkpoints),
+                             lookback_period, momentum_threshold, rebalance_frequency, initial_value, scheme),
+                       workers=workers, seed=seed)
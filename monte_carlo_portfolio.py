@@ -5,431 +5,523 @@ Automatically generated by Colab.
 
 Original file is located at
     https://colab.research.google.com/drive/1smjJMDIF6yfCT9gY-QU3dyfOiU3SusMH
+
+Importable pipeline: fetch -> clean -> returns -> simulate -> summarize -> render.
+Run as a script (python monte_carlo_portfolio.py --help) for the interactive report, or with
+--headless --output-dir DIR to write the tables (CSV) and figures (PNG) without a display.
+matplotlib and yfinance are only imported when rendering or fetching from Yahoo.
 """
 
+import argparse
+import json
+import os
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import yfinance as yf
-
-# Define parameters
-stock_symbols = ['BRK-B', 'WFC', 'OKE', 'NUE', 'HII','MSTR','XOM','TSLA','GEO','XLV','XLK','XLI','XLF','XLE']
-benchmark_symbol = '^GSPC'  # S&P 500 index
-start_date = '1999-01-01'
-end_date = '2024-12-31'
-simulation_runs = 1000
-time_horizon = 252  # 1 year of trading days
-
-# Fetch historical data using Yahoo Finance API
-all_symbols = stock_symbols + [benchmark_symbol]
-stock_data = yf.download(all_symbols, start=start_date, end=end_date)
-print("Stock data retrieved:")
-print(stock_data.head())  # Debugging output
-
-# Generate synthetic historical stock return data
-np.random.seed(42)
-dates = pd.date_range(start="1999-01-01", end="2024-12-31", freq="B")  # Business days
-num_stocks = len(stock_symbols)
-
-# Simulated daily log returns for each stock
-historical_stock_returns = np.random.normal(loc=0.0005, scale=0.01, size=(len(dates), num_stocks))
-
-# Convert to a DataFrame with stock symbols as columns
-historical_stock_returns_df = pd.DataFrame(historical_stock_returns, index=dates, columns=stock_symbols)
-
-# Compute cumulative returns for each stock
-historical_cumulative_returns_stocks = (1 + historical_stock_returns_df).cumprod()
-
-# Define moving average windows
-short_window = 50  # 50-day moving average
-long_window = 200  # 200-day moving average
-
-# Calculate moving averages for each stock
-short_moving_avg_stocks = historical_cumulative_returns_stocks.rolling(window=short_window).mean()
-long_moving_avg_stocks = historical_cumulative_returns_stocks.rolling(window=long_window).mean()
-
-# Plot cumulative returns and moving averages for each stock
-fig, ax = plt.subplots(figsize=(12, 6))
-
-for stock in stock_symbols:
-    ax.plot(historical_cumulative_returns_stocks[stock], label=f"{stock} Cumulative Return", alpha=0.7)
-    ax.plot(short_moving_avg_stocks[stock], linestyle="--", alpha=0.6, label=f"{stock} {short_window}-Day MA")
-    ax.plot(long_moving_avg_stocks[stock], linestyle="--", alpha=0.6, label=f"{stock} {long_window}-Day MA")
-
-# Labels and title
-ax.set_xlabel("Year")
-ax.set_ylabel("Cumulative Return")
-ax.set_title("Stock Cumulative Return with Moving Averages")
-ax.legend(loc="upper left", ncol=2, fontsize=8)
-ax.grid(True, linestyle='--', alpha=0.6)
-
-# Show the plot
-plt.show()
-
-# Compute key statistics for each stock
-stock_stats_df = pd.DataFrame(index=stock_symbols)
-
-# Calculate annualized return and volatility
-annualized_return = historical_stock_returns_df.mean() * 252 * 100  # Convert to percentage
-annualized_volatility = historical_stock_returns_df.std() * np.sqrt(252) * 100  # Convert to percentage
-
-# Define risk-free rate (assume 2%)
-risk_free_rate = 2
-
-# Compute Sharpe Ratio
-sharpe_ratio = (annualized_return - risk_free_rate) / annualized_volatility
-
-# Populate the DataFrame with statistics
-stock_stats_df["Annualized Return (%)"] = annualized_return
-stock_stats_df["Annualized Volatility (%)"] = annualized_volatility
-stock_stats_df["Sharpe Ratio"] = sharpe_ratio
-
-# Print the statistics table
-print(stock_stats_df)
-
-# Ensure data includes 'Adj Close' or fallback to 'Close'
-if 'Adj Close' in stock_data:
-    stock_data = stock_data['Adj Close']
-else:
-    stock_data = stock_data['Close']
-
-# Check available columns
-available_stocks = list(stock_data.columns)
-valid_stocks = [stock for stock in stock_symbols if stock in available_stocks]
-print("Valid stocks:", valid_stocks)  # Debugging output
-
-# Filter stock data to valid stocks
-stock_data = stock_data[valid_stocks + [benchmark_symbol]].dropna()
-print("Stock data after NaN removal:")
-print(stock_data.head())
-
-# Calculate log returns
-log_returns = np.log(stock_data / stock_data.shift(1)).dropna()
-mean_returns = log_returns.mean()
-std_dev = log_returns.std()
-
-# Define portfolio weights (equal weighting for now)
-num_stocks = len(valid_stocks)
-weights = np.array([1/num_stocks] * num_stocks) if num_stocks > 0 else np.array([])
-print("Weights:", weights)  # Debugging output
-
-# Ensure portfolio_cumulative is correctly calculated
-if num_stocks > 0:
-    print("Stock data shape:", stock_data.shape)
-    print("Weights shape:", weights.shape)
-    print("First row shape:", stock_data.iloc[0].shape)
-    print("Initial portfolio value:", stock_data.iloc[0][valid_stocks] @ weights)
-
-    try:
-        portfolio_cumulative = (stock_data[valid_stocks] @ weights) / (stock_data.iloc[0][valid_stocks] @ weights)
-        portfolio_cumulative = portfolio_cumulative.dropna()  # Drop NaN values just in case
-        portfolio_cumulative.index = pd.to_datetime(portfolio_cumulative.index)  # Ensure proper datetime index
-        print("Portfolio cumulative head:")
-        print(portfolio_cumulative.head())
-    except Exception as e:
-        print("Error in portfolio calculation:", e)
-        portfolio_cumulative = pd.Series(dtype=float)
-else:
-    print("No valid stocks in portfolio!")
-    portfolio_cumulative = pd.Series(dtype=float)
-
-# Debug: Check if portfolio_cumulative is empty
-if portfolio_cumulative.empty:
-    print("Warning: portfolio_cumulative is empty! No portfolio data available.")
-
-# Ensure S&P 500 cumulative returns are correctly calculated
-if benchmark_symbol in stock_data.columns:
-    try:
-        sp500_cumulative = (stock_data[benchmark_symbol] / stock_data[benchmark_symbol].iloc[0])
-        sp500_cumulative = sp500_cumulative.dropna()
-        sp500_cumulative.index = pd.to_datetime(sp500_cumulative.index)  # Ensure proper datetime index
-        print("S&P 500 cumulative head:")
-        print(sp500_cumulative.head())
-    except Exception as e:
-        print("Error in S&P 500 calculation:", e)
-        sp500_cumulative = pd.Series(dtype=float)
-else:
-    print("S&P 500 data not available!")
-    sp500_cumulative = pd.Series(dtype=float)
-
-# Calculate total rate of return
-portfolio_return = (portfolio_cumulative.iloc[-1] - 1) * 100 if not portfolio_cumulative.empty else None
-sp500_return = (sp500_cumulative.iloc[-1] - 1) * 100 if not sp500_cumulative.empty else None
-
-# Plot cumulative returns over 20 years
-plt.figure(figsize=(12, 6))
-if not portfolio_cumulative.empty:
-    plt.plot(portfolio_cumulative.index, portfolio_cumulative, label=f'Portfolio (Return: {portfolio_return:.2f}%)', linewidth=2, color='blue')
-    print("Plotting portfolio cumulative return.")  # Debugging output
-else:
-    print("Error: portfolio_cumulative is empty, no plot available.")
-
-if not sp500_cumulative.empty:
-    plt.plot(sp500_cumulative.index, sp500_cumulative, label=f'S&P 500 (Return: {sp500_return:.2f}%)', linestyle='dashed', color='red')
-    print("Plotting S&P 500 cumulative return.")  # Debugging output
-else:
-    print("Error: S&P 500 cumulative return is empty, no plot available.")
-
-plt.title("Cumulative Growth of Portfolio Over 20 Years")
-plt.xlabel("Year")
-plt.ylabel("Cumulative Growth")
-plt.legend()
-plt.show()
-
-"""Potforlio Returns Range Year 1 - 10"""
-
-# Calculate log returns (excluding S&P 500 for portfolio calculations)
-log_returns = np.log(stock_data / stock_data.shift(1)).dropna()
-mean_returns = log_returns[valid_stocks].mean().to_numpy()  # Only use portfolio stocks
-std_dev = log_returns[valid_stocks].std().to_numpy()  # Only use portfolio stocks
-
-# Define portfolio weights (equal weighting for now)
-num_stocks = len(valid_stocks)
-weights = np.array([1/num_stocks] * num_stocks) if num_stocks > 0 else np.array([])
-print("Weights:", weights)  # Debugging output
-
-# Monte Carlo Simulation for portfolio returns over different years
-years = [1, 3, 5, 7, 10]
-percentile_5th, median, percentile_95th = [], [], []
-
-for year in years:
-    days = year * 252
-    simulated_returns = []
-
-    for _ in range(simulation_runs):
-        daily_drift = (mean_returns - 0.5 * std_dev ** 2) / 252  # Scale drift per day
-        daily_shock = std_dev / np.sqrt(252)  # Scale volatility per day
-
-        # Generate daily returns using GBM
-        random_shocks = np.random.normal(0, 1, (num_stocks, days))
-        daily_returns = np.exp(daily_drift[:, np.newaxis] + daily_shock[:, np.newaxis] * random_shocks)
-        price_paths = np.cumprod(daily_returns, axis=1)  # Cumulative product to get price paths
-        simulated_portfolio_return = np.dot(weights, price_paths[:, -1]) - 1  # Final portfolio return
-        simulated_returns.append(simulated_portfolio_return)
-
-    percentile_5th.append(np.percentile(simulated_returns, 5) * 100)
-    median.append(np.percentile(simulated_returns, 50) * 100)
-    percentile_95th.append(np.percentile(simulated_returns, 95) * 100)
-
-# Define years for simulation
-years = [1, 3, 5, 7, 10]
-
-# Generate random sample data for illustration (replace with actual simulation results)
-np.random.seed(42)  # For reproducibility
-simulation_runs = 1000
-simulated_returns = np.random.normal(loc=0.07, scale=0.15, size=(len(years), simulation_runs)) * 100  # Convert to percentage
-
-# Compute actual percentiles from simulated data
-percentile_5th = np.percentile(simulated_returns, 5, axis=1)
-median = np.percentile(simulated_returns, 50, axis=1)
-percentile_95th = np.percentile(simulated_returns, 95, axis=1)
-
-# Create a DataFrame with years as rows
-percent_return_df = pd.DataFrame({
-    "5th Percentile (%)": percentile_5th,
-    "Median (%)": median,
-    "95th Percentile (%)": percentile_95th
-}, index=years)
-
-# Rename index to "Years"
-percent_return_df.index.name = "Years"
-
-# Print results
-print(percent_return_df)
-
-# Create a stacked bar chart ensuring 5th and 95th percentiles have the exact same color
-fig, ax = plt.subplots(figsize=(8, 6))
-
-# Define common color for 5th and 95th percentile ranges
-percentile_color = '#1f77b4'  # Standard blue color
-
-# Plot stacked bars with the exact same color for 5th and 95th percentiles
-ax.bar(years, median - percentile_5th, bottom=percentile_5th, color='gray', label='Median')
-ax.bar(years, percentile_95th - median, bottom=median, color=percentile_color, label='95th Percentile')
-ax.bar(years, percentile_5th, color=percentile_color, label='5th Percentile')
-
-# Labels and title
-ax.set_xticks(years)
-ax.set_xticklabels([f"Year {y}" for y in years])
-ax.set_ylabel("Return (Percent)")
-ax.set_title("Monte Carlo Simulation: Percentile Return Ranges")
-
-# Increase Y-axis limits for better visibility
-ax.set_ylim(min(percentile_5th) - 30, max(percentile_95th) + 30)
-
-# Legend
-ax.legend(loc="upper left")
-
-# Show the plot
-plt.show()
-
-# Histogram of the portfolio returns using the simulated data
-fig, ax = plt.subplots(figsize=(8, 6))
-
-# Flatten the simulated returns data for histogram plotting
-all_simulated_returns = simulated_returns.flatten()
-
-# Plot histogram
-ax.hist(all_simulated_returns, bins=50, color='blue', alpha=0.7, edgecolor='black')
-
-# Labels and title
-ax.set_xlabel("Portfolio Return (%)")
-ax.set_ylabel("Frequency")
-ax.set_title("Histogram of Portfolio Returns (Monte Carlo Simulation)")
-
-# Show the plot
-plt.show()
-
-initial_portfolio_value = 1000000
-
-# Monte Carlo Simulation based on historical stock statistics
-simulation_runs = 1000  # Number of Monte Carlo simulations
-years_projection = np.arange(0, 21)  # Years 0 to 20
-time_horizon = len(years_projection) * 252  # Convert years to trading days
-
-# Simulated daily log returns for each stock
-historical_stock_returns = np.random.normal(loc=0.0005, scale=0.01, size=(len(dates), num_stocks))
-
-# Convert to DataFrame with stock symbols as columns
-historical_stock_returns_df = pd.DataFrame(historical_stock_returns, index=dates, columns=stock_symbols)
-
-# Compute portfolio log returns using equal weighting
-portfolio_log_returns = historical_stock_returns_df.mean(axis=1)
-
-# Calculate historical mean return and volatility for the portfolio
-historical_mean_return = portfolio_log_returns.mean() * 252  # Annualized mean return
-historical_volatility = portfolio_log_returns.std() * np.sqrt(252)  # Annualized volatility
-
-# Simulate portfolio returns using historical mean return and volatility
-simulated_portfolio_returns = np.exp(
-    np.cumsum(np.random.normal(historical_mean_return / 252, historical_volatility / np.sqrt(252),
-                               (simulation_runs, time_horizon)), axis=1)
-)
-
-# Scale initial portfolio value
-simulated_portfolio_values = simulated_portfolio_returns * initial_portfolio_value
-
-# Extract values at each year marker
-portfolio_projections = {p: [] for p in [10, 25, 50, 75, 90]}
-for year in years_projection:
-    day_index = year * 252 if year * 252 < time_horizon else -1  # Avoid out-of-bounds indexing
-    for p in portfolio_projections.keys():
-        portfolio_projections[p].append(np.percentile(simulated_portfolio_values[:, day_index], p))
-
-# Create a DataFrame to display portfolio values in dollars for different percentiles
-portfolio_value_df = pd.DataFrame(portfolio_projections, index=years_projection)
-
-# Rename columns for better readability
-portfolio_value_df.columns = [f"{p}th Percentile ($)" for p in portfolio_projections.keys()]
-
-# Rename index to "Years"
-portfolio_value_df.index.name = "Years"
-
-# Round values to the nearest dollar
-portfolio_value_df = portfolio_value_df.round(0).astype(int)
-
-# Print results
-print(portfolio_value_df)
-
-import matplotlib.ticker as ticker
 
-# Create a figure and axis for the plot
-fig, ax = plt.subplots(figsize=(10, 6))
+from gbm import (adaptive_simulate_checkpoints, checkpoint_loss_estimates, checkpoint_percentile_errors,
+                 checkpoint_percentiles, expected_value, parallel_simulate_checkpoints, simulate_asset_growth,
+                 year_marker_days)
+from adaptive import simulate_until_converged
+from bootstrap import bootstrap_checkpoints
+from covariance import CovarianceEstimator
+from frontier import efficient_frontier, random_weights, sweep_buy_and_hold
+from garch import fit_garch, parallel_simulate_garch_checkpoints
+from market_data import MarketData
+from momentum import parallel_simulate_momentum_strategy, simulate_momentum_strategy
+from parallel import sharded_labels
+from price_store import PriceStore, csv_directory_fetcher, yahoo_fetcher
+from result_cache import ResultCache, cache_key
+from sampling import replicate_labels
 
-# Plot each percentile projection
-for p in portfolio_projections.keys():
-    ax.plot(years_projection, portfolio_value_df[f"{p}th Percentile ($)"], label=f"{p}th Percentile")
-
-# Labels and title
-ax.set_xlabel("Years")
-ax.set_ylabel("Portfolio Value ($)")
-ax.set_title("Projected Market Portfolio Value Over 20 Years Based on Selected Stocks")
-ax.set_xticks(years_projection)
-ax.legend()
-ax.grid(True, linestyle='--', alpha=0.6)
-
-# Format y-axis as currency
-ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'${x:,.0f}'))
-
-# Show the plot
-plt.show()
-
-# Compute percentage returns relative to the initial portfolio value ($1M)
-portfolio_return_df = (portfolio_value_df / initial_portfolio_value - 1) * 100
-
-# Round to two decimal places for readability
-portfolio_return_df = portfolio_return_df.round(2)
-
-# Print results
-print(portfolio_return_df)
-
-"""Momentum Strategy"""
-
-# Define momentum-based Monte Carlo simulation parameters
-lookback_period = 252  # 1-year lookback for momentum signal
-momentum_threshold = 0.02  # Momentum threshold for overweighting trending stocks
-
-# momentum scores (rolling 1-year return for each stock)
-momentum_scores = historical_stock_returns_df.rolling(lookback_period).mean()
-
-# Assign portfolio weights based on momentum (higher weight for higher momentum stocks)
-momentum_weights = momentum_scores.div(momentum_scores.abs().sum(axis=1), axis=0).fillna(1/num_stocks)
-
-# momentum-weighted portfolio returns
-momentum_portfolio_returns = (historical_stock_returns_df * momentum_weights.shift(1)).sum(axis=1)
-
-# historical mean return and volatility for the momentum strategy
-momentum_mean_return = momentum_portfolio_returns.mean() * 252  # Annualized return
-momentum_volatility = momentum_portfolio_returns.std() * np.sqrt(252)  # Annualized volatility
-
-# Monte Carlo Simulation based on momentum-adjusted returns
-simulated_momentum_returns = np.exp(
-    np.cumsum(np.random.normal(momentum_mean_return / 252, momentum_volatility / np.sqrt(252),
-                               (simulation_runs, time_horizon)), axis=1)
-)
-
-# Scale initial portfolio value
-simulated_momentum_values = simulated_momentum_returns * initial_portfolio_value
-
-# Extract values at each year marker
-momentum_portfolio_projections = {p: [] for p in [10, 25, 50, 75, 90]}
-for year in years_projection:
-    day_index = year * 252 if year * 252 < time_horizon else -1  # Avoid out-of-bounds indexing
-    for p in momentum_portfolio_projections.keys():
-        momentum_portfolio_projections[p].append(np.percentile(simulated_momentum_values[:, day_index], p))
-
-# Create a DataFrame to display momentum strategy portfolio values
-momentum_portfolio_value_df = pd.DataFrame(momentum_portfolio_projections, index=years_projection)
-
-# Rename columns for better readability
-momentum_portfolio_value_df.columns = [f"{p}th Percentile ($)" for p in momentum_portfolio_projections.keys()]
-
-# Rename index to "Years"
-momentum_portfolio_value_df.index.name = "Years"
-
-# Round values to the nearest dollar
-momentum_portfolio_value_df = momentum_portfolio_value_df.round(0).astype(int)
-
-# Display results
-print(momentum_portfolio_value_df)
-
-# Re-plot the Monte Carlo simulation results for momentum strategy
-fig, ax = plt.subplots(figsize=(10, 6))
-
-# Plot each percentile projection
-for p in momentum_portfolio_projections.keys():
-    ax.plot(years_projection, momentum_portfolio_value_df[f"{p}th Percentile ($)"], label=f"{p}th Percentile")
-
-# Labels and title
-ax.set_xlabel("Years")
-ax.set_ylabel("Portfolio Value ($)")
-ax.set_title("Monte Carlo Simulation with Momentum Strategy Over 20 Years")
-ax.set_xticks(years_projection)
-ax.legend()
-ax.grid(True, linestyle='--', alpha=0.6)
-
-# Format y-axis as currency
-ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'${x:,.0f}'))
-
-# Show the plot
-plt.show()
\ No newline at end of file
+# Define parameters
+DEFAULT_CONFIG = {
+    "stock_symbols": ['BRK-B', 'WFC', 'OKE', 'NUE', 'HII', 'MSTR', 'XOM', 'TSLA', 'GEO', 'XLV', 'XLK', 'XLI', 'XLF', 'XLE'],
+    "benchmark_symbol": '^GSPC',  # S&P 500 index
+    "start_date": '1999-01-01',
+    "end_date": '2024-12-31',
+    "price_source": 'yahoo',  # 'yahoo' or a directory of <TICKER>_HistoricalData.csv files
+    "price_store_dir": None,  # Local close-price store, populated from the price source on first run; None: data/store/yahoo, or <price_source>/store/csv for a CSV directory (shared with pie.py)
+    "simulation_runs": 1000,
+    "horizon_years": [1, 3, 5, 7, 10],
+    "projection_years": 20,
+    "initial_portfolio_value": 1000000,
+    "risk_free_rate": 2,  # Percent, for the synthetic stock statistics
+    "seed": 42,
+    "sampling_scheme": 'plain',  # 'plain', 'antithetic' or 'sobol' (scrambled Sobol with Brownian bridge)
+    "projection_model": 'gbm',  # 'gbm', 'bootstrap' (stationary block bootstrap of the real log returns) or 'garch' (per-stock GARCH(1,1), constant correlation)
+    "projection_tolerance": None,  # e.g. 0.01 runs the 20-year projections until each percentile is within +/-1% (95% CI); gbm only
+    "max_projection_runs": 1000000,  # Path budget for the adaptive projections
+    "projection_paths_file": None,  # e.g. 'output/projection_paths.npy' also writes the daily 20-year paths behind the projection as a float32 memmap (gbm, plain sampling, no tolerance)
+    "frontier_candidates": 2000,  # Random weight vectors evaluated against the shared longest-horizon paths
+    "simulation_workers": 1,  # Processes for the 20-year projections; results are reproducible per seed and worker count
+    "return_window": None,  # e.g. 252 estimates the GBM drift and volatility from the last 252 days only
+    "return_halflife": None,  # e.g. 63 weights the history exponentially instead (63-day halflife); exclusive with return_window
+    "return_shrinkage": False,  # Shrink the estimated covariance towards a scaled identity (Ledoit-Wolf)
+    "lookback_period": 252,  # 1-year lookback for momentum signal
+    "momentum_threshold": 0.02,  # Momentum threshold for overweighting trending stocks
+    "rebalance_frequency": 21,  # Rebalance monthly inside every simulated path
+    "cache_dir": 'data/cache',  # Simulation results of earlier identical runs (keyed by prices and parameters); None disables
+    "cache_max_bytes": 1024 ** 3,  # Least recently used cache entries are evicted beyond this size
+    "output_dir": None,  # Write tables and figures here
+    "show": True,  # Open interactive plot windows
+}
+
+def load_config(path=None, **overrides):
+    # Defaults, updated from a JSON config file and then from explicit overrides
+    config = dict(DEFAULT_CONFIG)
+    if path is not None:
+        with open(path) as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+        config.update(file_config)
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+def fetch(config):
+    # Historical closes from the local price store, fetching only bars it does not have yet
+    all_symbols = config["stock_symbols"] + [config["benchmark_symbol"]]
+    if config["price_source"] == 'yahoo':
+        fetcher, default_store_dir = yahoo_fetcher, os.path.join('data', 'store', 'yahoo')
+    else:
+        fetcher = csv_directory_fetcher(config["price_source"])
+        default_store_dir = os.path.join(config["price_source"], 'store', 'csv')
+    # A store only ever holds one source's prices, see PriceStore.check_source
+    price_store = PriceStore(config["price_store_dir"] or default_store_dir)
+    price_store.update(fetcher, all_symbols, start=config["start_date"], end=config["end_date"])
+    stock_data = price_store.load(start=config["start_date"], end=config["end_date"])
+    print("Stock data retrieved:")
+    print(stock_data.head())
+    return stock_data
+
+def clean(stock_data, config):
+    # Keep the configured stocks that have data, plus the benchmark, on their common dates
+    valid_stocks = [stock for stock in config["stock_symbols"] if stock in stock_data.columns]
+    print("Valid stocks:", valid_stocks)
+    if not valid_stocks:
+        raise ValueError("No valid stocks in portfolio!")
+    if config["benchmark_symbol"] not in stock_data.columns:
+        raise ValueError(f"Benchmark {config['benchmark_symbol']} not available!")
+    return stock_data[valid_stocks + [config["benchmark_symbol"]]].dropna(), valid_stocks
+
+def synthetic_returns(config):
+    # Synthetic daily log returns for each stock (business days), reproducible for the configured seed
+    dates = pd.date_range(start=config["start_date"], end=config["end_date"], freq="B")
+    stock_symbols = config["stock_symbols"]
+    historical_stock_returns = np.random.RandomState(config["seed"]).normal(loc=0.0005, scale=0.01,
+                                                                            size=(len(dates), len(stock_symbols)))
+    return pd.DataFrame(historical_stock_returns, index=dates, columns=stock_symbols)
+
+def compute_returns(market, valid_stocks, config):
+    # Portfolio inputs from the MarketData of the cleaned prices (stocks and benchmark)
+    benchmark_symbol = config["benchmark_symbol"]
+
+    # Log return statistics (excluding S&P 500 for portfolio calculations)
+    stocks = market.select(valid_stocks)
+    if config["return_window"] is None and config["return_halflife"] is None and not config["return_shrinkage"]:
+        mean_returns = stocks.mean_returns(log=True)
+        std_dev = stocks.std(log=True)
+    else:
+        estimator = CovarianceEstimator(len(valid_stocks), window=config["return_window"],
+                                        halflife=config["return_halflife"], shrinkage=config["return_shrinkage"])
+        estimator.update_many(stocks.log_return_array)
+        mean_returns = estimator.mean()
+        std_dev = np.sqrt(np.diag(estimator.covariance()))
+
+    # Define portfolio weights (equal weighting for now)
+    weights = np.full(len(valid_stocks), 1 / len(valid_stocks))
+    print("Weights:", weights)
+
+    # Cumulative growth of the portfolio and the S&P 500
+    portfolio_cumulative = pd.Series(stocks.price_array @ weights / (stocks.price_array[0] @ weights), index=market.index)
+    sp500_cumulative = market.cumulative_returns[benchmark_symbol]
+
+    return {
+        "valid_stocks": valid_stocks,
+        "stocks": stocks,
+        "mean_returns": mean_returns,
+        "std_dev": std_dev,
+        "weights": weights,
+        "portfolio_cumulative": portfolio_cumulative.dropna(),
+        "sp500_cumulative": sp500_cumulative.dropna(),
+    }
+
+def daily_gbm_parameters(returns):
+    daily_drift = (returns["mean_returns"] - 0.5 * returns["std_dev"] ** 2) / 252  # Scale drift per day
+    daily_shock = returns["std_dev"] / np.sqrt(252)  # Scale volatility per day
+    return daily_drift, daily_shock
+
+def projection_gbm_parameters(synthetic):
+    # Daily mean and volatility of the equal-weight synthetic portfolio's log returns
+    portfolio_log_returns = synthetic.simple_return_array.mean(axis=1)
+    return portfolio_log_returns.mean(), portfolio_log_returns.std(ddof=1)
+
+def simulate_horizons(returns, config):
+    # One set of GBM paths out to the longest horizon, read off at every horizon (common random numbers)
+    daily_drift, daily_shock = daily_gbm_parameters(returns)
+    horizon_growth = simulate_asset_growth(daily_drift, daily_shock, np.array(config["horizon_years"]) * 252,
+                                           config["simulation_runs"], rng=config["seed"], scheme=config["sampling_scheme"])
+    horizon_returns = horizon_growth @ returns["weights"] - 1  # Buy-and-hold portfolio return at each horizon
+
+    # Evaluate the equal-weight portfolio and random candidates against the same paths at the longest horizon
+    candidate_weights = np.vstack([returns["weights"],
+                                   random_weights(config["frontier_candidates"], len(returns["weights"]), rng=config["seed"])])
+    longest = int(np.argmax(config["horizon_years"]))
+    candidate_results = sweep_buy_and_hold(horizon_growth[longest], candidate_weights, config["initial_portfolio_value"], 1.0)
+    candidate_results["Weights"] = [dict(zip(returns["valid_stocks"], np.round(w, 3))) for w in candidate_weights]
+
+    return {"horizon_returns": horizon_returns, "candidate_results": candidate_results}
+
+PROJECTION_MODELS = ('gbm', 'bootstrap', 'garch')
+
+def simulate_projection(returns, synthetic, config):
+    # Portfolio value at each year marker over the projection, from the synthetic portfolio statistics
+    if config["projection_model"] not in PROJECTION_MODELS:
+        raise ValueError(f"Unknown projection model '{config['projection_model']}', expected one of {PROJECTION_MODELS}")
+    if config["projection_tolerance"] is not None and config["projection_model"] != 'gbm':
+        raise ValueError("projection_tolerance (adaptive projections) is only supported with the gbm projection model")
+    paths_file = config["projection_paths_file"]
+    if paths_file is not None and (config["projection_model"] != 'gbm' or config["projection_tolerance"] is not None
+                                   or config["sampling_scheme"] != 'plain'):
+        raise ValueError("projection_paths_file needs the gbm projection model, plain sampling and no projection_tolerance")
+
+    years_projection = np.arange(0, config["projection_years"] + 1)
+    time_horizon = len(years_projection) * 252  # Convert years to trading days
+    checkpoint_days = year_marker_days(years_projection, time_horizon)
+    simulation_runs = config["simulation_runs"]
+    scheme = config["sampling_scheme"]
+    initial_value = config["initial_portfolio_value"]
+
+    daily_mean, daily_volatility = projection_gbm_parameters(synthetic)
+
+    if config["projection_model"] == 'bootstrap':
+        # Resample blocks of the real equal-weight (daily rebalanced) portfolio log returns instead of GBM
+        bootstrap_log_returns = np.log1p(returns["stocks"].simple_return_array @ returns["weights"])
+        values = bootstrap_checkpoints(bootstrap_log_returns, time_horizon, checkpoint_days, simulation_runs,
+                                       initial_value=initial_value, seed=config["seed"])
+        labels = replicate_labels(simulation_runs)
+    elif config["projection_model"] == 'garch':
+        # Volatility clustering: per-stock GARCH(1,1) fitted to the real log returns, started from today's volatility
+        garch_params = fit_garch(returns["stocks"].log_return_array)
+        values = parallel_simulate_garch_checkpoints(garch_params, returns["weights"], time_horizon, checkpoint_days,
+                                                     simulation_runs, initial_value=initial_value,
+                                                     workers=config["simulation_workers"], seed=config["seed"],
+                                                     scheme=scheme)
+        labels = sharded_labels(simulation_runs, config["simulation_workers"], scheme)
+    elif config["projection_tolerance"] is None:
+        # With projection_paths_file the checkpoint values are read off the daily paths written there
+        values = parallel_simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoint_days, simulation_runs,
+                                               initial_value=initial_value, workers=config["simulation_workers"],
+                                               seed=config["seed"], scheme=scheme, paths_file=paths_file)
+        labels = sharded_labels(simulation_runs, config["simulation_workers"], scheme)
+    else:
+        # Simulate in batches until the percentile confidence intervals are tight enough
+        adaptive_projection = adaptive_simulate_checkpoints(daily_mean, daily_volatility, time_horizon, checkpoint_days,
+                                                            initial_value=initial_value,
+                                                            quantile_tolerance=config["projection_tolerance"],
+                                                            max_paths=config["max_projection_runs"],
+                                                            seed=config["seed"], scheme=scheme)
+        values = adaptive_projection["values"]
+        labels = replicate_labels(adaptive_projection["paths"], scheme)
+        print(f"Adaptive projection: {adaptive_projection['paths']} paths, converged: {adaptive_projection['converged']}")
+
+    return {"years_projection": years_projection, "time_horizon": time_horizon, "checkpoint_days": checkpoint_days,
+            "values": values, "labels": labels}
+
+def simulate_momentum(synthetic, projection, config):
+    # Monte Carlo Simulation running the momentum rule inside each multi-asset path, streamed to the year markers
+    momentum_daily_mean = synthetic.mean_returns()
+    momentum_daily_cov = synthetic.covariance()
+    strategy = dict(lookback_period=config["lookback_period"], momentum_threshold=config["momentum_threshold"],
+                    rebalance_frequency=config["rebalance_frequency"], initial_value=config["initial_portfolio_value"])
+
+    if config["projection_tolerance"] is None:
+        return parallel_simulate_momentum_strategy(momentum_daily_mean, momentum_daily_cov, projection["time_horizon"],
+                                                   projection["checkpoint_days"], config["simulation_runs"],
+                                                   workers=config["simulation_workers"], seed=config["seed"] + 1,
+                                                   scheme=config["sampling_scheme"], **strategy)
+
+    momentum_rng = np.random.default_rng(config["seed"] + 1)
+    adaptive_momentum = simulate_until_converged(
+        lambda n_paths: simulate_momentum_strategy(momentum_daily_mean, momentum_daily_cov, projection["time_horizon"],
+                                                   projection["checkpoint_days"], n_paths, rng=momentum_rng,
+                                                   scheme=config["sampling_scheme"], **strategy),
+        percentiles=[10, 25, 50, 75, 90], quantile_tolerance=config["projection_tolerance"],
+        max_paths=config["max_projection_runs"])
+    print(f"Adaptive momentum projection: {adaptive_momentum['paths']} paths, converged: {adaptive_momentum['converged']}")
+    return adaptive_momentum["values"]
+
+def simulate(returns, synthetic, config):
+    simulations = simulate_horizons(returns, config)
+    simulations["projection"] = simulate_projection(returns, synthetic, config)
+    simulations["momentum_values"] = simulate_momentum(synthetic, simulations["projection"], config)
+    return simulations
+
+# Settings that change the simulated numbers; everything else (display, output, data locations) is not part of the cache key
+SIMULATION_KEYS = ("stock_symbols", "benchmark_symbol", "start_date", "end_date", "simulation_runs", "horizon_years",
+                   "projection_years", "initial_portfolio_value", "seed", "sampling_scheme", "projection_model",
+                   "projection_tolerance", "max_projection_runs", "frontier_candidates", "simulation_workers",
+                   "return_window", "return_halflife", "return_shrinkage", "lookback_period", "momentum_threshold",
+                   "rebalance_frequency")
+
+def cached_simulate(market, returns, synthetic, config):
+    # simulate(), memoized on the cleaned price history and the simulation settings. Runs that also
+    # write the full projection paths always simulate, since a cache hit would skip that file.
+    if config["cache_dir"] is None or config["projection_paths_file"] is not None:
+        return simulate(returns, synthetic, config)
+    key = cache_key("monte_carlo_portfolio", market.prices, {name: config[name] for name in SIMULATION_KEYS})
+    simulations, _ = ResultCache(config["cache_dir"], config["cache_max_bytes"]).get_or_compute(
+        key, lambda: (simulate(returns, synthetic, config), None))
+    return simulations
+
+def _value_table(values, years_projection):
+    # Percentiles at each year marker, rounded to the nearest dollar
+    projections = checkpoint_percentiles(values, [10, 25, 50, 75, 90])
+    value_df = pd.DataFrame(projections, index=years_projection)
+    value_df.columns = [f"{p}th Percentile ($)" for p in projections.keys()]
+    value_df.index.name = "Years"
+    return value_df.round(0).astype(int)
+
+def _loss_table(estimates, index, unit):
+    # Mean and loss probability estimates from gbm.checkpoint_loss_estimates, one row per checkpoint
+    names = {"mean": f"Mean ({unit})", "mean_error": f"Mean SE ({unit})", "control_mean": f"Analytic Mean ({unit})",
+             "loss_rate": "Loss Probability (%)", "loss_rate_error": "Loss Probability SE (%)",
+             "cv_loss_rate": "Control-Variate Loss Probability (%)", "cv_loss_rate_error": "Control-Variate SE (%)"}
+    loss_df = pd.DataFrame({names[name]: values * (100 if "loss_rate" in name else 1)
+                            for name, values in estimates.items()}, index=index)
+    loss_df.index.name = "Years"
+    return loss_df.round(2)
+
+def summarize(returns, synthetic, simulations, config):
+    # All report tables, keyed by name
+    scheme = config["sampling_scheme"]
+    years = config["horizon_years"]
+    tables = {}
+
+    # Compute key statistics for each (synthetic) stock
+    annualized_return = pd.Series(synthetic.mean_returns(), index=synthetic.columns) * 252 * 100  # Convert to percentage
+    annualized_volatility = pd.Series(synthetic.std(), index=synthetic.columns) * np.sqrt(252) * 100  # Convert to percentage
+    tables["stock_stats"] = pd.DataFrame({
+        "Annualized Return (%)": annualized_return,
+        "Annualized Volatility (%)": annualized_volatility,
+        "Sharpe Ratio": (annualized_return - config["risk_free_rate"]) / annualized_volatility,
+    })
+
+    # Percentile return ranges for each horizon
+    simulated_returns = simulations["horizon_returns"] * 100  # Convert to percentage, one row per horizon
+    percent_return_df = pd.DataFrame({
+        "5th Percentile (%)": np.percentile(simulated_returns, 5, axis=1),
+        "Median (%)": np.percentile(simulated_returns, 50, axis=1),
+        "95th Percentile (%)": np.percentile(simulated_returns, 95, axis=1),
+    }, index=years)
+    percent_return_df.index.name = "Years"
+    tables["percent_return"] = percent_return_df
+
+    # Standard error of each percentile from the spread across replicate groups
+    percentile_errors = checkpoint_percentile_errors(simulated_returns, [5, 50, 95],
+                                                     labels=replicate_labels(config["simulation_runs"], scheme))
+    percentile_error_df = pd.DataFrame({
+        "5th Percentile SE (%)": percentile_errors[5],
+        "Median SE (%)": percentile_errors[50],
+        "95th Percentile SE (%)": percentile_errors[95],
+    }, index=years)
+    percentile_error_df.index.name = "Years"
+    tables["percentile_error"] = percentile_error_df
+
+    # Mean return and probability of a loss at each horizon; the analytic GBM mean of the buy-and-hold
+    # return makes the simulated return a control variate for the loss probability
+    daily_drift, daily_shock = daily_gbm_parameters(returns)
+    horizon_means = np.array([returns["weights"] @ expected_value(daily_drift, daily_shock, horizon * 252) - 1
+                              for horizon in years]) * 100
+    tables["loss_probability"] = _loss_table(
+        checkpoint_loss_estimates(simulated_returns, 0.0, control_means=horizon_means,
+                                  labels=replicate_labels(config["simulation_runs"], scheme)), years, "%")
+
+    # Efficient frontier over the candidates (failure = losing money over the horizon)
+    candidate_results = simulations["candidate_results"]
+    tables["frontier"] = efficient_frontier(candidate_results)
+    tables["equal_weight"] = candidate_results.iloc[[0]]
+    tables["max_sharpe"] = candidate_results.loc[[candidate_results["Sharpe Ratio"].idxmax()]]
+
+    # Projected portfolio values, their standard errors and percentage returns
+    projection = simulations["projection"]
+    years_projection = projection["years_projection"]
+    tables["portfolio_value"] = _value_table(projection["values"], years_projection)
+    projection_errors = checkpoint_percentile_errors(projection["values"], [10, 25, 50, 75, 90], labels=projection["labels"])
+    projection_error_df = pd.DataFrame(projection_errors, index=years_projection).round(0)
+    projection_error_df.columns = [f"{p}th Percentile SE ($)" for p in projection_errors.keys()]
+    projection_error_df.index.name = "Years"
+    tables["projection_error"] = projection_error_df
+
+    # Checkpoint day d compounds d + 1 daily shocks; only the GBM projection has an analytic mean
+    control_means = None
+    if config["projection_model"] == 'gbm':
+        control_means = expected_value(*projection_gbm_parameters(synthetic), projection["checkpoint_days"] + 1,
+                                       config["initial_portfolio_value"])
+    tables["projection_loss"] = _loss_table(
+        checkpoint_loss_estimates(projection["values"], config["initial_portfolio_value"], control_means=control_means,
+                                  labels=projection["labels"]), years_projection, "$")
+    tables["portfolio_return"] = ((tables["portfolio_value"] / config["initial_portfolio_value"] - 1) * 100).round(2)
+
+    tables["momentum_value"] = _value_table(simulations["momentum_values"], years_projection)
+    return tables
+
+def print_tables(tables, config):
+    scheme = config["sampling_scheme"]
+    print(tables["stock_stats"])
+    print(tables["percent_return"])
+    print(f"Percentile standard errors ({scheme} sampling):")
+    print(tables["percentile_error"])
+    print(tables["loss_probability"])
+    print(f"Equal-weight portfolio over {max(config['horizon_years'])} years:")
+    print(tables["equal_weight"].iloc[0])
+    print(f"Efficient frontier ({len(tables['frontier'])} of {config['frontier_candidates'] + 1} candidates):")
+    print(tables["frontier"].drop(columns="Weights").round(4))
+    print("Highest Sharpe ratio weights:", tables["max_sharpe"]["Weights"].iloc[0])
+    print(tables["portfolio_value"])
+    print(f"Projection standard errors ({scheme} sampling):")
+    print(tables["projection_error"])
+    print(tables["projection_loss"])
+    print(tables["portfolio_return"])
+    print(tables["momentum_value"])
+
+def save_tables(tables, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(output_dir, f"{name}.csv"))
+
+def render(returns, synthetic, simulations, tables, config):
+    # Builds every figure; saves PNGs when output_dir is set and opens windows when show is set
+    import matplotlib
+    if not config["show"]:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
+    figures = {}
+
+    # Plot cumulative returns and moving averages for each stock
+    historical_cumulative_returns_stocks = synthetic.cumulative_returns
+    short_window = 50  # 50-day moving average
+    long_window = 200  # 200-day moving average
+    short_moving_avg_stocks = synthetic.rolling_mean(short_window)
+    long_moving_avg_stocks = synthetic.rolling_mean(long_window)
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for stock in synthetic.columns:
+        ax.plot(historical_cumulative_returns_stocks[stock], label=f"{stock} Cumulative Return", alpha=0.7)
+        ax.plot(short_moving_avg_stocks[stock], linestyle="--", alpha=0.6, label=f"{stock} {short_window}-Day MA")
+        ax.plot(long_moving_avg_stocks[stock], linestyle="--", alpha=0.6, label=f"{stock} {long_window}-Day MA")
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Cumulative Return")
+    ax.set_title("Stock Cumulative Return with Moving Averages")
+    ax.legend(loc="upper left", ncol=2, fontsize=8)
+    ax.grid(True, linestyle='--', alpha=0.6)
+    figures["moving_averages"] = fig
+
+    # Plot cumulative returns of the portfolio against the S&P 500
+    portfolio_cumulative = returns["portfolio_cumulative"]
+    sp500_cumulative = returns["sp500_cumulative"]
+    portfolio_return = (portfolio_cumulative.iloc[-1] - 1) * 100
+    sp500_return = (sp500_cumulative.iloc[-1] - 1) * 100
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(portfolio_cumulative.index, portfolio_cumulative, label=f'Portfolio (Return: {portfolio_return:.2f}%)', linewidth=2, color='blue')
+    ax.plot(sp500_cumulative.index, sp500_cumulative, label=f'S&P 500 (Return: {sp500_return:.2f}%)', linestyle='dashed', color='red')
+    ax.set_title("Cumulative Growth of Portfolio Over 20 Years")
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Cumulative Growth")
+    ax.legend()
+    figures["cumulative_growth"] = fig
+
+    # Stacked bar chart with the same color for the 5th and 95th percentile ranges
+    years = config["horizon_years"]
+    percent_return_df = tables["percent_return"]
+    percentile_5th = percent_return_df["5th Percentile (%)"].to_numpy()
+    median = percent_return_df["Median (%)"].to_numpy()
+    percentile_95th = percent_return_df["95th Percentile (%)"].to_numpy()
+    percentile_color = '#1f77b4'  # Standard blue color
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.bar(years, median - percentile_5th, bottom=percentile_5th, color='gray', label='Median')
+    ax.bar(years, percentile_95th - median, bottom=median, color=percentile_color, label='95th Percentile')
+    ax.bar(years, percentile_5th, color=percentile_color, label='5th Percentile')
+    ax.set_xticks(years)
+    ax.set_xticklabels([f"Year {y}" for y in years])
+    ax.set_ylabel("Return (Percent)")
+    ax.set_title("Monte Carlo Simulation: Percentile Return Ranges")
+    ax.set_ylim(min(percentile_5th) - 30, max(percentile_95th) + 30)
+    ax.legend(loc="upper left")
+    figures["percentile_ranges"] = fig
+
+    # Histogram of the portfolio returns using the simulated data
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.hist((simulations["horizon_returns"] * 100).flatten(), bins=50, color='blue', alpha=0.7, edgecolor='black')
+    ax.set_xlabel("Portfolio Return (%)")
+    ax.set_ylabel("Frequency")
+    ax.set_title("Histogram of Portfolio Returns (Monte Carlo Simulation)")
+    figures["return_histogram"] = fig
+
+    # Projected percentile paths for the market portfolio and the momentum strategy
+    years_projection = simulations["projection"]["years_projection"]
+    for name, title in [("portfolio_value", "Projected Market Portfolio Value Over 20 Years Based on Selected Stocks"),
+                        ("momentum_value", "Monte Carlo Simulation with Momentum Strategy Over 20 Years")]:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        for column in tables[name].columns:
+            ax.plot(years_projection, tables[name][column], label=column.replace(" ($)", ""))
+        ax.set_xlabel("Years")
+        ax.set_ylabel("Portfolio Value ($)")
+        ax.set_title(title)
+        ax.set_xticks(years_projection)
+        ax.legend()
+        ax.grid(True, linestyle='--', alpha=0.6)
+        ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'${x:,.0f}'))
+        figures[name] = fig
+
+    if config["output_dir"] is not None:
+        os.makedirs(config["output_dir"], exist_ok=True)
+        for name, fig in figures.items():
+            fig.savefig(os.path.join(config["output_dir"], f"{name}.png"), dpi=100, bbox_inches="tight")
+    if config["show"]:
+        plt.show()
+    else:
+        for fig in figures.values():
+            plt.close(fig)
+    return figures
+
+def run(config, render_figures=True):
+    stock_data = fetch(config)
+    stock_data, valid_stocks = clean(stock_data, config)
+    market = MarketData(stock_data)
+    returns = compute_returns(market, valid_stocks, config)
+    synthetic = MarketData.from_returns(synthetic_returns(config))
+    simulations = cached_simulate(market, returns, synthetic, config)
+    tables = summarize(returns, synthetic, simulations, config)
+
+    print_tables(tables, config)
+    if config["output_dir"] is not None:
+        save_tables(tables, config["output_dir"])
+    if render_figures and (config["show"] or config["output_dir"] is not None):
+        render(returns, synthetic, simulations, tables, config)
+    return tables
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo portfolio projections")
+    parser.add_argument("--config", help="JSON file overriding the default parameters")
+    parser.add_argument("--output-dir", help="Write tables (CSV) and figures (PNG) to this directory")
+    parser.add_argument("--headless", action="store_true", help="Do not open plot windows")
+    parser.add_argument("--no-plots", action="store_true", help="Skip rendering figures entirely")
+    parser.add_argument("--simulation-runs", type=int)
+    parser.add_argument("--workers", type=int, dest="simulation_workers")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, output_dir=args.output_dir, simulation_runs=args.simulation_runs,
+                         simulation_workers=args.simulation_workers, seed=args.seed)
+    if args.headless:
+        config["show"] = False
+    return run(config, render_figures=not args.no_plots)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sampling import replicate_labels
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def shard_sizes(simulation_runs, workers):
+    # Split paths as evenly as possible, earlier shards take the remainder
+    base, extra = divmod(simulation_runs, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+def sharded_labels(simulation_runs, workers=None, scheme="plain", replicates=8):
+    # Replicate group of each path in run_sharded output order (labels restart in every shard)
+    workers = workers or default_workers()
+    return np.concatenate([replicate_labels(size, scheme, replicates) for size in shard_sizes(simulation_runs, workers)])
+
+def run_sharded(shard_fn, simulation_runs, args=(), workers=None, seed=None, per_shard_args=()):
+    # Runs shard_fn(n_paths, seed_sequence, *args, *per_shard) once per worker and concatenates the
+    # reduced results along the last (path) axis in shard order. Each shard gets its own
+    # SeedSequence child, so the output is bit-identical for a given seed and worker count
+    # whether the shards run in a pool or in-process. per_shard_args are lists with one entry
+    # per worker (e.g. each shard's first path index).
+    workers = workers or default_workers()
+    sizes = shard_sizes(simulation_runs, workers)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    shard_args = [[arg] * workers for arg in args] + [list(values) for values in per_shard_args]
+
+    if workers == 1:
+        results = [shard_fn(sizes[0], seeds[0], *args, *(values[0] for values in per_shard_args))]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(shard_fn, sizes, seeds, *shard_args))
+
+    return np.concatenate(results, axis=-1)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+
+def _is_file(out):
+    return isinstance(out, (str, os.PathLike))
+
+def allocate_paths(shape, dtype=np.float64, out=None):
+    # Output target for simulated paths: an in-memory array when out is None, out itself when it
+    # is an array, or - when out is a file path - an empty .npy of the right shape and dtype on disk
+    if out is None:
+        return np.empty(shape=shape, dtype=dtype)
+    if _is_file(out):
+        directory = os.path.dirname(os.fspath(out))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=shape).flush()
+        return out
+    if out.shape != tuple(shape):
+        raise ValueError(f"Output array has shape {out.shape}, expected {tuple(shape)}")
+    return out
+
+def write_paths(paths, index, block):
+    # Stores one block of paths. File targets are mapped only for the duration of the write, so
+    # resident memory is bounded by the block rather than by everything written so far.
+    if not _is_file(paths):
+        paths[index] = block
+        return
+    mapped = np.load(paths, mmap_mode="r+")
+    mapped[index] = block
+    mapped.flush()
+    del mapped
+
+def finish_paths(paths):
+    # The array to hand back to the caller: file targets come back as a lazy read-only memmap
+    return open_paths(paths) if _is_file(paths) else paths
+
+def open_paths(path):
+    # Lazily read paths written to disk; nothing is loaded until it is indexed
+    return np.load(path, mmap_mode="r")
+
+def iter_path_chunks(paths, chunk_size, axis=-1):
+    # Yields (start, stop, chunk) blocks of paths along axis, one chunk in memory at a time
+    n_paths = paths.shape[axis]
+    for start in range(0, n_paths, chunk_size):
+        stop = min(start + chunk_size, n_paths)
+        index = [slice(None)] * paths.ndim
+        index[axis] = slice(start, stop)
+        yield start, stop, np.asarray(paths[tuple(index)])
@@ -1,54 +1,161 @@
 import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 
+from adaptive import simulate_until_converged
+from bootstrap import bootstrap_simulation
+from cash_flows import simulate_holdings
+from covariance import CovarianceEstimator
+from factor_model import cached_fit_factor_model, covariance_loss, factor_monte_carlo_simulation, fit_factor_model
+from fan_chart import draw_fan_chart, fan_chart_data, plot_fan_chart
+from garch import fit_garch, garch_simulation
+from instrumentation import DISABLED, Instrumentation, JsonLinesSink
+from market_data import MarketData
+from parallel import run_sharded
+from path_storage import allocate_paths, finish_paths, iter_path_chunks, write_paths
+from price_store import PriceStore, csv_directory_fetcher, read_close_csv
+from result_cache import ResultCache, cache_key
+from risk_metrics import RiskAccumulator
+from sampling import NormalSampler, control_variate, estimate, replicate_labels
+
+
+RETURN_MODELS = ("normal", "bootstrap", "factor", "garch")
 
 DATA_DIR = os.path.join(os.getcwd(), "data")  
 sp500_csv = os.path.join(DATA_DIR, "SPY_HistoricalData.csv")  
+PRICE_STORE_DIR = os.path.join(DATA_DIR, "store", "csv")  # One store per price source, see price_store.PriceStore
 
-def load_etf_data(data_dir):
-    etf_data = pd.DataFrame()
+def load_etf_data(data_dir, store_dir=None):
     etf_files = [f for f in os.listdir(data_dir) if f.endswith(".csv") and "SPY" not in f]
-    stock_list = [f.split("_")[0] for f in etf_files]  
+    stock_list = [f.split("_")[0] for f in etf_files]
+    if not etf_files:
+        raise FileNotFoundError(f"No ETF price CSVs (other than SPY) in {data_dir}")
 
-    for file in etf_files:
-        ticker = file.split("_")[0]
-        file_path = os.path.join(data_dir, file)
-        df = pd.read_csv(file_path, parse_dates=["Date"], index_col="Date")
-        if "Close/Last" in df.columns:
-            df = df.rename(columns={"Close/Last": "Close"})
+    if store_dir is not None:
+        # Re-import from the CSVs only when one of them is newer than the store
+        store = PriceStore(store_dir)
+        fetcher = csv_directory_fetcher(data_dir)
+        store.check_source(fetcher.source)
+        newest_csv = max(os.path.getmtime(os.path.join(data_dir, f)) for f in etf_files)
+        if newest_csv > store.modified_time() or not set(stock_list) <= set(store.symbols()):
+            store.update(fetcher, stock_list)
+        etf_data = store.load(stock_list)
+    else:
+        closes = [read_close_csv(os.path.join(data_dir, file), ticker) for file, ticker in zip(etf_files, stock_list)]
+        etf_data = pd.concat(closes, axis=1, join="outer")
 
-        if "Close" not in df.columns:
-            raise ValueError(f"Missing 'Close' column in {file}")
+    return etf_data.dropna(), stock_list
 
-        df = df.rename(columns={"Close": ticker})
+def regime_schedule(meanReturns, covMatrix, weights, T, regimes=None):
+    # Per-day portfolio mean (T,) and loading (T, n) for a sequence of (start_day, meanReturns,
+    # covMatrix) regimes; meanReturns/covMatrix apply before the first regime starts
+    weights = np.asarray(weights, dtype=float)
+    schedule = [(0, meanReturns, covMatrix)] + sorted(regimes or [], key=lambda regime: regime[0])
+    day_mean, day_loading = np.empty(T), np.empty((T, len(weights)))
+    for (start, mean, cov), (stop, _, _) in zip(schedule, schedule[1:] + [(T, None, None)]):
+        day_mean[start:stop] = np.dot(weights, mean)
+        day_loading[start:stop] = np.linalg.cholesky(cov).T @ weights
+    return day_mean, day_loading
 
-        if etf_data.empty:
-            etf_data = df[[ticker]]
+def _simulation_blocks(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio, block_size, seed, scheme, sampler, dtype,
+                       regimes=None, cholesky=None):
+    # Yields (start, stop, (T, stop - start) paths) blocks.
+    # Factor once and project onto the weights: w . (L z) == (L^T w) . z, so each
+    # block of paths is a single (paths, T, n) @ (n,) product instead of a Python loop.
+    # With regimes the mean and loading switch on the regime start days.
+    weights = np.asarray(weights, dtype=float)
+    sampler = NormalSampler(scheme, T, len(weights), rng=seed, dtype=dtype) if sampler is None else sampler
+    if regimes:
+        day_mean, day_loading = regime_schedule(meanReturns, covMatrix, weights, T, regimes)
+        portfolio_mean, portfolio_loading = day_mean.astype(dtype), day_loading.astype(dtype)
+    else:
+        L = np.linalg.cholesky(covMatrix) if cholesky is None else cholesky
+        portfolio_mean = np.dot(weights, meanReturns).astype(dtype)
+        portfolio_loading = (L.T @ weights).astype(dtype)
+
+    # Draws are path-major, so a given seed yields the same paths for any block_size
+    # (up to BLAS rounding); block_size only bounds the size of the normal block.
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        Z = sampler.draw(stop - start)
+        if regimes:
+            dailyReturns = portfolio_mean + np.einsum("ptn,tn->pt", Z, portfolio_loading)
         else:
-            etf_data = etf_data.join(df[[ticker]], how="outer")
+            dailyReturns = portfolio_mean + Z @ portfolio_loading
+        yield start, stop, (np.cumprod(dailyReturns + 1, axis=1) * initialPortfolio).T
+
+def monte_carlo_simulation(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio, block_size=1000, seed=None,
+                           scheme="plain", sampler=None, dtype=np.float64, out=None, risk=None, regimes=None,
+                           cholesky=None):
+    # dtype=np.float32 generates and compounds in single precision; out (a file path or
+    # array) receives the (T, mc_sims) paths block by block, e.g. as a disk-backed memmap.
+    # risk (a risk_metrics.RiskAccumulator) is updated with every block as it is simulated.
+    # regimes is a sequence of (start_day, meanReturns, covMatrix) switched to during each path.
+    # cholesky, the lower factor of covMatrix when already known (e.g. MarketData.cholesky()), skips
+    # refactoring it.
+    portfolio_sims = allocate_paths((T, mc_sims), dtype=dtype, out=out)
+    for start, stop, block in _simulation_blocks(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio,
+                                                 block_size, seed, scheme, sampler, dtype, regimes, cholesky):
+        write_paths(portfolio_sims, (slice(None), slice(start, stop)), block)
+        if risk is not None:
+            risk.update(block)
 
-    etf_data.dropna(inplace=True) 
-    return etf_data, stock_list
+    return finish_paths(portfolio_sims)
 
-def monte_carlo_simulation(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio):
-    meanM = np.full(shape=(T, len(weights)), fill_value=meanReturns)
-    meanM = meanM.T 
+def monte_carlo_risk(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio, floor=None, block_size=1000,
+                     seed=None, scheme="plain", dtype=np.float64, regimes=None):
+    # Same paths as monte_carlo_simulation, reduced to per-path risk metrics block by block
+    # without storing them; returns the filled RiskAccumulator
+    risk = RiskAccumulator(initialPortfolio, floor=floor)
+    for _, _, block in _simulation_blocks(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio,
+                                          block_size, seed, scheme, None, dtype, regimes):
+        risk.update(block)
+    return risk
 
-    portfolio_sims = np.full(shape=(T, mc_sims), fill_value=0.0)
-    for m in range(mc_sims):
-        Z = np.random.normal(size=(T, len(weights)))
-        L = np.linalg.cholesky(covMatrix)
-        dailyReturns = meanM + np.inner(L, Z)
-        portfolio_sims[:, m] = np.cumprod(np.inner(weights, dailyReturns.T) + 1) * initialPortfolio
+def expected_terminal_value(meanReturns, weights, T, initialPortfolio, regimes=None):
+    # Daily returns are independent across days, so E[prod(1 + r_t)] = (1 + w . mu)^T
+    # (or the product over days of each day's regime mean)
+    if regimes:
+        schedule = [(0, meanReturns)] + sorted(((start, mean) for start, mean, _ in regimes), key=lambda regime: regime[0])
+        days = np.diff([min(start, T) for start, _ in schedule] + [T])
+        return initialPortfolio * np.prod([(1 + np.dot(weights, mean)) ** n for (_, mean), n in zip(schedule, days)])
+    return initialPortfolio * (1 + np.dot(weights, meanReturns)) ** T
 
-    return portfolio_sims
+def _checkpoint_shard(mc_sims, seed_sequence, meanReturns, covMatrix, weights, T, initialPortfolio, checkpoints, block_size, scheme,
+                      regimes=None):
+    # Simulates one shard block by block, keeping only the checkpoint rows
+    sampler = NormalSampler(scheme, T, len(weights), rng=seed_sequence)
+    values = np.empty(shape=(len(checkpoints), mc_sims))
+    for start in range(0, mc_sims, block_size):
+        stop = min(start + block_size, mc_sims)
+        sims = monte_carlo_simulation(meanReturns, covMatrix, weights, T, stop - start, initialPortfolio,
+                                      block_size=block_size, sampler=sampler, regimes=regimes)
+        values[:, start:stop] = sims[checkpoints]
+    return values
+
+def parallel_monte_carlo_simulation(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio,
+                                    checkpoints=None, workers=None, seed=None, block_size=1000, scheme="plain", regimes=None):
+    # Shards paths across a process pool and returns only the portfolio values on the
+    # checkpoint days as a (len(checkpoints), mc_sims) array; the default is the final day.
+    checkpoints = np.array([T - 1]) if checkpoints is None else np.asarray(checkpoints)
+    return run_sharded(_checkpoint_shard, mc_sims,
+                       args=(np.asarray(meanReturns), np.asarray(covMatrix), np.asarray(weights, dtype=float),
+                             T, initialPortfolio, checkpoints, block_size, scheme, regimes),
+                       workers=workers, seed=seed)
+
+def plot_simulation(portfolio_sims, mode="fan", n_samples=20, seed=None, fan_data=None):
+    # mode="fan" draws percentile bands over a time-value density raster plus n_samples sample
+    # paths, reduced chunk by chunk (or taken from precomputed fan_chart.fan_chart_data output);
+    # mode="paths" draws every path (only practical for a few hundred)
+    import matplotlib.pyplot as plt
 
-def plot_simulation(portfolio_sims):
     plt.figure(figsize=(10, 6))
-    plt.plot(portfolio_sims)
+    if mode == "paths":
+        plt.plot(portfolio_sims)
+    elif fan_data is not None:
+        draw_fan_chart(fan_data)
+    else:
+        plot_fan_chart(portfolio_sims, n_samples=n_samples, rng=seed)
     plt.ylabel('Portfolio Value ($)')
     plt.xlabel('Days')
     plt.title('Monte Carlo Simulation')
@@ -61,7 +168,114 @@ def calculate_failure_rate(portfolio_sims, initialPortfolio, expected_gain):
     failure_rate = (nb_losses / portfolio_sims.shape[1]) * 100
     return failure_rate
 
-def historical_comparison(etf_data, sp500_csv, weights):
+def calculate_ruin_rate(portfolio_sims, ruin_level=0.0):
+    # Percentage of paths at or below ruin_level on any day, not just the last one
+    ruined = np.zeros(portfolio_sims.shape[1], dtype=bool)
+    for start, stop, chunk in iter_path_chunks(portfolio_sims, 1000):
+        ruined[start:stop] = chunk.min(axis=0) <= ruin_level
+    return ruined.mean() * 100
+
+def failure_rate_estimate(portfolio_sims, initialPortfolio, expected_gain, scheme="plain", control_mean=None, replicates=8):
+    # Failure rate (%) and its standard error; with control_mean (the analytic expected terminal
+    # value) the terminal value is used as a control variate for the loss indicator
+    final_values = portfolio_sims[-1]
+    losses = (final_values < initialPortfolio * expected_gain).astype(float)
+    if control_mean is not None:
+        losses = control_variate(losses, final_values, control_mean)
+    rate, error = estimate(losses, labels=replicate_labels(len(losses), scheme, replicates))
+    return rate * 100, error * 100
+
+def adaptive_monte_carlo_simulation(meanReturns, covMatrix, weights, T, initialPortfolio, expected_gain,
+                                    percentiles=(10, 25, 50, 75, 90), failure_tolerance=0.5, quantile_tolerance=0.01,
+                                    max_paths=1000000, max_seconds=None, block_size=1000, seed=None, scheme="plain"):
+    # Simulates batches of paths until the failure rate is within failure_tolerance percentage
+    # points and each percentile of the final value within quantile_tolerance (relative), or the
+    # budget runs out; "values" holds the final portfolio values
+    sampler = NormalSampler(scheme, T, len(weights), rng=seed)
+
+    def simulate_batch(n_paths):
+        # Only the final day of each block is kept, so memory stays at one block however large the batch
+        final_values = np.empty(n_paths)
+        for start, stop, block in _simulation_blocks(meanReturns, covMatrix, weights, T, n_paths, initialPortfolio,
+                                                     block_size, None, scheme, sampler, np.float64):
+            final_values[start:stop] = block[-1]
+        return final_values
+
+    return simulate_until_converged(simulate_batch, percentiles=percentiles,
+                                    failure_threshold=initialPortfolio * expected_gain,
+                                    failure_tolerance=failure_tolerance, quantile_tolerance=quantile_tolerance,
+                                    batch_size=block_size, max_paths=max_paths, max_seconds=max_seconds)
+
+def simulation_summary(market, weights, T, mc_sims, initialPortfolio, expected_gain, floor=0.8, return_model="normal",
+                       scheme="plain", seed=None, keep_paths=False, regimes=None, plan=None, factor_model=None,
+                       instrumentation=DISABLED):
+    # Simulates and reduces one run of a MarketData history to everything the report needs (failure
+    # rate, terminal value distribution, path-risk summary, fan-chart data); returns (summary, arrays) where arrays
+    # holds the float32 paths when keep_paths is set. This is the unit cached by ResultCache.
+    # plan (keyword arguments of cash_flows.simulate_holdings: rebalancing, cash flows, fees and
+    # costs) simulates per-asset holdings under the normal model instead of a fixed-weight return.
+    # return_model="factor" simulates from factor_model (default: a 3-factor PCA fit of returns).
+    risk = RiskAccumulator(initialPortfolio, floor=initialPortfolio * floor)
+    if return_model not in RETURN_MODELS:
+        raise ValueError(f"Unknown return model '{return_model}', expected one of {RETURN_MODELS}")
+    if return_model == "bootstrap" and scheme != "plain":
+        raise ValueError("The bootstrap model resamples history and only supports plain sampling")
+    if regimes and return_model != "normal":
+        raise ValueError("Regimes are only simulated with the normal return model")
+    if plan is not None and (return_model != "normal" or regimes):
+        raise ValueError("Cash-flow plans are only simulated with the normal return model and no regimes")
+    with instrumentation.stage("monte_carlo_simulation", paths=mc_sims, scheme=scheme):
+        if plan is not None:
+            portfolio_sims = simulate_holdings(market.mean_returns(), market.covariance(), weights, T, mc_sims, initialPortfolio,
+                                               seed=seed, scheme=scheme, risk=risk, **plan)
+            control_mean = None  # No closed form once flows depend on the path
+        elif return_model == "bootstrap":
+            portfolio_sims = bootstrap_simulation(market.simple_return_array, weights, T, mc_sims, initialPortfolio, seed=seed)
+            for _, _, block in iter_path_chunks(portfolio_sims, 1000):
+                risk.update(block)
+            control_mean = None
+        elif return_model == "factor":
+            factor_model = fit_factor_model(market.simple_return_array, 3) if factor_model is None else factor_model
+            portfolio_sims = factor_monte_carlo_simulation(factor_model, weights, T, mc_sims, initialPortfolio,
+                                                           seed=seed, scheme=scheme, risk=risk)
+            control_mean = expected_terminal_value(factor_model["mean"], weights, T, initialPortfolio)
+        elif return_model == "garch":
+            portfolio_sims = garch_simulation(fit_garch(market.log_return_array), weights, T, mc_sims, initialPortfolio,
+                                              seed=seed, scheme=scheme)
+            for _, _, block in iter_path_chunks(portfolio_sims, 1000):
+                risk.update(block)
+            control_mean = None
+        else:  # normal
+            portfolio_sims = monte_carlo_simulation(market.mean_returns(), market.covariance(), weights, T, mc_sims,
+                                                    initialPortfolio, seed=seed, scheme=scheme, risk=risk, regimes=regimes,
+                                                    cholesky=market.cholesky())
+            control_mean = expected_terminal_value(market.mean_returns(), weights, T, initialPortfolio, regimes=regimes)
+
+    with instrumentation.stage("summaries", paths=mc_sims):
+        failure_rate, failure_rate_error = failure_rate_estimate(
+            portfolio_sims, initialPortfolio, expected_gain, scheme=scheme, control_mean=control_mean)
+        final_values = portfolio_sims[-1, :]
+        summary = {
+            "scheme": scheme,
+            "failure_rate": failure_rate,
+            "failure_rate_error": failure_rate_error,
+            "ruin_rate": calculate_ruin_rate(portfolio_sims),
+            "percentiles": np.percentile(final_values, [10, 25, 50, 75, 90]),
+            "avg_final_value": np.mean(final_values),
+            "std_dev_final_value": np.std(final_values),
+            "best_case": np.max(final_values),
+            "worst_case": np.min(final_values),
+            "risk": risk.summary(levels=(0.95, 0.99), percentiles=(5, 50, 95)),
+            "fan_chart": fan_chart_data(portfolio_sims, rng=seed),
+        }
+        if return_model == "factor":
+            summary["covariance_loss"] = covariance_loss(factor_model, market.covariance(), weights)
+    return summary, ({"portfolio_sims": portfolio_sims.astype(np.float32)} if keep_paths else {})
+
+def historical_comparison(market, sp500_csv, weights):
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
     sp500_data = pd.read_csv(sp500_csv, parse_dates=['Date'], index_col='Date')
 
     if "Close/Last" in sp500_data.columns:
@@ -73,7 +287,7 @@ def historical_comparison(etf_data, sp500_csv, weights):
     sp500_data.sort_index(inplace=True)
     sp500_returns = sp500_data['Close'].pct_change().cumsum()
 
-    portfolio_returns = etf_data.pct_change()
+    portfolio_returns = market.simple_returns
     weighted_portfolio_returns = portfolio_returns * weights
     daily_weighted_return = weighted_portfolio_returns.sum(axis=1).cumsum()
 
@@ -89,7 +303,6 @@ def historical_comparison(etf_data, sp500_csv, weights):
     plt.xticks(rotation=90)
     plt.legend()
     plt.grid(axis='y')
-    plt.show()
 
 def save_results_to_file(output_text, filename="simulation_results.txt"):
     with open(filename, "w") as f:
@@ -98,37 +311,89 @@ def save_results_to_file(output_text, filename="simulation_results.txt"):
 
 
 if __name__ == '__main__':
-    etf_data, stock_list = load_etf_data(DATA_DIR)
-    returns = etf_data.pct_change()
-    meanReturns = returns.mean()
-    covMatrix = returns.cov()
-    weights = np.random.random(len(stock_list))
-    weights /= np.sum(weights)
+    metrics_file = None  # e.g. "simulation_metrics.jsonl" appends per-stage timings as JSON lines; None disables instrumentation
+    trace_stage_memory = False  # Also record each stage's peak allocations (tracemalloc; slows the traced stages)
+    profile_stages = False  # Also record the hottest lines of each stage with a sampling profiler
     mc_sims = 10000  
     T = 365  
     initialPortfolio = 100000  
-    portfolio_sims = monte_carlo_simulation(meanReturns, covMatrix, weights, T, mc_sims, initialPortfolio)
+    sampling_scheme = "plain"  # "plain", "antithetic" or "sobol"
+    return_model = "normal"  # "normal" (correlated normal returns), "bootstrap" (stationary block bootstrap of the history),
+                             # "garch" or "factor" (low-rank factor model, for large universes)
+    factor_count = 3  # Factors of the "factor" model; its fit is cached with the results
+    recent_regime_days = None  # e.g. 63 simulates the first 63 days from an exponentially weighted (21-day halflife), shrunk
+                               # covariance of recent returns before switching to the full-history estimate (normal model)
+    instrumentation = Instrumentation(JsonLinesSink(metrics_file) if metrics_file else None, trace_memory=trace_stage_memory,
+                                      profile=profile_stages, mc_sims=mc_sims, T=T, return_model=return_model)
 
+    with instrumentation.stage("load_etf_data"):
+        etf_data, stock_list = load_etf_data(DATA_DIR, PRICE_STORE_DIR)
+    with instrumentation.stage("covariance"):
+        market = MarketData(etf_data)
+        covMatrix = pd.DataFrame(market.covariance(), index=stock_list, columns=stock_list)
+        regimes = None
+        if recent_regime_days:
+            recent = CovarianceEstimator(len(stock_list), halflife=21, shrinkage=True).update_many(market.simple_return_array)
+            regimes = [(0, recent.mean(), recent.covariance()), (recent_regime_days, market.mean_returns(), market.covariance())]
+    weights = np.random.default_rng(42).random(len(stock_list))  # Fixed, so repeated runs share cached results
+    weights /= np.sum(weights)
     expected_gain = 1.1  
-    failure_rate = calculate_failure_rate(portfolio_sims, initialPortfolio, expected_gain)
-    
-    final_values = portfolio_sims[-1, :]
-    avg_final_value = np.mean(final_values)
-    std_dev_final_value = np.std(final_values)
-    percentiles = np.percentile(final_values, [10, 25, 50, 75, 90])
-    best_case = np.max(final_values)
-    worst_case = np.min(final_values)
-
-    portfolio_annual_return = returns.mean().mean() * 252
-    portfolio_annual_volatility = returns.std().mean() * np.sqrt(252)
-    sharpe_ratio = portfolio_annual_return / portfolio_annual_volatility
-    max_drawdown = (etf_data / etf_data.cummax() - 1).min().min()
+    floor = 0.8  # Report the probability of the portfolio ever closing below 80% of its initial value
+    # Holdings, rebalancing, cash flows and costs (normal model); None compounds the fixed weights daily.
+    # e.g. dict(rebalance_frequency=63, rebalance_threshold=0.05, cash_flows=cash_flows.scheduled_flows(T, -2000, 21),
+    #           management_fee=0.005, transaction_cost=0.001) redeems $2,000 a month with quarterly rebalancing
+    plan = None
+    cache_dir = os.path.join(DATA_DIR, "cache")  # Reduced results of earlier identical runs; None always simulates
+    cache_paths = False  # Also cache the simulated paths (as float32)
+    result_cache = None if cache_dir is None else ResultCache(cache_dir)
+
+    factor_model = None
+    if return_model == "factor":
+        with instrumentation.stage("factor_model", n_factors=factor_count):
+            factor_model = cached_fit_factor_model(market.simple_returns, factor_count, cache=result_cache)
+
+    def compute_summary():
+        return simulation_summary(market, weights, T, mc_sims, initialPortfolio, expected_gain, floor=floor,
+                                  return_model=return_model, scheme=sampling_scheme, seed=42, keep_paths=cache_paths,
+                                  regimes=regimes, plan=plan, factor_model=factor_model, instrumentation=instrumentation)
+
+    if result_cache is None:
+        summary, arrays = compute_summary()
+    else:
+        with instrumentation.stage("result_cache") as cache_stage:
+            key = cache_key(market.simple_returns, weights, T=T, mc_sims=mc_sims, initialPortfolio=initialPortfolio,
+                            expected_gain=expected_gain, floor=floor, return_model=return_model,
+                            scheme=sampling_scheme, seed=42, regimes=regimes, plan=plan,
+                            factor_count=factor_count if return_model == "factor" else None, keep_paths=cache_paths)
+            cache_stage["hit"] = key in result_cache
+        summary, arrays = result_cache.get_or_compute(key, compute_summary)
+    failure_rate, failure_rate_error = summary["failure_rate"], summary["failure_rate_error"]
+    percentiles = summary["percentiles"]
+    avg_final_value, std_dev_final_value = summary["avg_final_value"], summary["std_dev_final_value"]
+    best_case, worst_case = summary["best_case"], summary["worst_case"]
+    risk_summary = summary["risk"]
+    factor_text = ""
+    if "covariance_loss" in summary:
+        loss = summary["covariance_loss"]
+        factor_text = f"""
+
+    Factor Model ({factor_count} factors) vs. Full Covariance:
+    - Variance Explained by Factors: {loss["explained_variance"]:.1%}
+    - Covariance Lost (relative Frobenius norm): {loss["frobenius"]:.2%}
+    - Daily Portfolio Volatility: {loss["factor_volatility"]:.4%} (full covariance {loss["full_volatility"]:.4%})"""
+
+    with instrumentation.stage("historical_statistics"):
+        portfolio_annual_return = market.mean_returns().mean() * 252
+        portfolio_annual_volatility = market.std().mean() * np.sqrt(252)
+        sharpe_ratio = portfolio_annual_return / portfolio_annual_volatility
+        max_drawdown = market.drawdowns.min().min()
 
     results_text = f"""
     === Monte Carlo Simulation Results ===
     Initial Portfolio Value: ${initialPortfolio:,.2f}
     Expected Gain (Target): {expected_gain*100:.1f}%
-    Failure Rate: {failure_rate:.2f}%
+    Failure Rate: {failure_rate:.2f}% (standard error {failure_rate_error:.2f}%, {return_model} model, {sampling_scheme} sampling)
+    Ruin Rate (portfolio exhausted at any time): {summary["ruin_rate"]:.2f}%
     
     Portfolio Value Distribution:
     - 10th Percentile: ${percentiles[0]:,.2f}
@@ -142,6 +407,16 @@ if __name__ == '__main__':
     - Best Case: ${best_case:,.2f}
     - Worst Case: ${worst_case:,.2f}
 
+    Simulated Path Risk (5th / 50th / 95th percentile across paths):
+    - Maximum Drawdown: {risk_summary["max_drawdown"][5]:.2%} / {risk_summary["max_drawdown"][50]:.2%} / {risk_summary["max_drawdown"][95]:.2%}
+    - Time Under Water: {risk_summary["time_under_water"][5]:.1%} / {risk_summary["time_under_water"][50]:.1%} / {risk_summary["time_under_water"][95]:.1%} of days
+    - Longest Time Under Water: {risk_summary["longest_under_water"][5]:.0f} / {risk_summary["longest_under_water"][50]:.0f} / {risk_summary["longest_under_water"][95]:.0f} days
+    - Terminal VaR / CVaR (95%): {risk_summary["terminal_var_0.95"]:.2%} / {risk_summary["terminal_cvar_0.95"]:.2%}
+    - Terminal VaR / CVaR (99%): {risk_summary["terminal_var_0.99"]:.2%} / {risk_summary["terminal_cvar_0.99"]:.2%}
+    - Path-wise VaR / CVaR (95%): {risk_summary["path_var_0.95"]:.2%} / {risk_summary["path_cvar_0.95"]:.2%}
+    - Path-wise VaR / CVaR (99%): {risk_summary["path_var_0.99"]:.2%} / {risk_summary["path_cvar_0.99"]:.2%}
+    - Probability of Falling Below ${initialPortfolio * floor:,.2f}: {risk_summary["floor_breach_probability"]:.2%}{factor_text}
+
     === ETF Portfolio vs. S&P 500 ===
     Portfolio Annualized Return: {portfolio_annual_return:.2%}
     Portfolio Annualized Volatility: {portfolio_annual_volatility:.2%}
@@ -155,7 +430,12 @@ if __name__ == '__main__':
     {covMatrix}
     """
 
-    save_results_to_file(results_text)
+    with instrumentation.stage("save_results_to_file"):
+        save_results_to_file(results_text)
 
-    plot_simulation(portfolio_sims)
-    historical_comparison(etf_data, sp500_csv, weights)
+    plot_simulation(arrays.get("portfolio_sims"), fan_data=summary["fan_chart"])
+    with instrumentation.stage("historical_comparison"):
+        historical_comparison(market, sp500_csv, weights)
+    # Shown outside the stage, so its wall time does not include how long the window stays open
+    import matplotlib.pyplot as plt
+    plt.show()
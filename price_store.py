@@ -0,0 +1,187 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def read_close_csv(file_path, ticker):
+    # Reads one *_HistoricalData.csv export as a Close series named after the ticker
+    df = pd.read_csv(file_path, parse_dates=["Date"], index_col="Date")
+    if "Close/Last" in df.columns:
+        df = df.rename(columns={"Close/Last": "Close"})
+
+    if "Close" not in df.columns:
+        raise ValueError(f"Missing 'Close' column in {os.path.basename(file_path)}")
+
+    return df["Close"].rename(ticker).sort_index()
+
+def csv_directory_fetcher(data_dir):
+    # Fetcher backed by a directory of <TICKER>_HistoricalData.csv files
+    def fetch(symbols, start=None, end=None):
+        closes = []
+        for symbol in symbols:
+            file_path = os.path.join(data_dir, f"{symbol}_HistoricalData.csv")
+            if os.path.exists(file_path):
+                closes.append(read_close_csv(file_path, symbol))
+        if not closes:
+            return pd.DataFrame()
+        return pd.concat(closes, axis=1, join="outer").loc[start:end]
+
+    fetch.source = f"csv:{os.path.abspath(data_dir)}"
+    return fetch
+
+def yahoo_fetcher(symbols, start=None, end=None):
+    # Fetcher backed by Yahoo Finance; adjusted closes when available
+    import yfinance as yf
+
+    data = yf.download(list(symbols), start=start, end=end)
+    if data.empty:
+        return pd.DataFrame()
+    return data["Adj Close"] if "Adj Close" in data else data["Close"]
+
+yahoo_fetcher.source = "yahoo"
+
+def _starts_before(start, covered):
+    # Whether a request from start reaches back before history covered from covered (None: all of it)
+    if covered is None:
+        return False
+    return start is None or pd.Timestamp(start) < pd.Timestamp(covered)
+
+
+class PriceStore:
+    # Aligned close-price matrix on disk: closes.npy (dates x symbols, NaN where missing),
+    # dates.npy (datetime64[ns]) and symbols.npy. Loads are memory-mapped, so reading a
+    # contiguous date range of the full symbol set does not copy the prices. meta.json records
+    # the fetcher's source and, per symbol, the start date its history was fetched from (None:
+    # the full history), so prices from different sources never mix in one store.
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, f"{name}.npy")
+
+    def exists(self):
+        return all(os.path.exists(self._path(name)) for name in ("closes", "dates", "symbols"))
+
+    def modified_time(self):
+        return os.path.getmtime(self._path("closes")) if self.exists() else 0.0
+
+    def _meta(self):
+        path = os.path.join(self.store_dir, "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def source(self):
+        return self._meta().get("source")
+
+    def check_source(self, source):
+        # Refuses to mix sources: a store only takes prices from the source that first wrote it
+        if source is not None and self.exists() and self.source() != source:
+            raise ValueError(f"Price store {self.store_dir} holds prices from {self.source() or 'an unrecorded source'}, "
+                             f"not {source}; delete it or use a separate store directory for each price source")
+
+    def symbols(self):
+        return list(np.load(self._path("symbols"))) if self.exists() else []
+
+    def last_date(self):
+        if not self.exists():
+            return None
+        dates = np.load(self._path("dates"), mmap_mode="r")
+        return pd.Timestamp(dates[-1]) if len(dates) else None
+
+    def load(self, symbols=None, start=None, end=None):
+        if not self.exists():
+            raise FileNotFoundError(f"No price store in {self.store_dir}")
+
+        closes = np.load(self._path("closes"), mmap_mode="r")
+        dates = pd.DatetimeIndex(np.load(self._path("dates")))
+        stored_symbols = self.symbols()
+
+        first = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side="left")
+        last = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side="right")
+        if symbols is None or list(symbols) == stored_symbols:
+            symbols = stored_symbols
+            values = closes[first:last]
+        else:
+            missing = [s for s in symbols if s not in stored_symbols]
+            if missing:
+                raise KeyError(f"Symbols not in price store: {missing}")
+            values = closes[first:last, [stored_symbols.index(s) for s in symbols]]
+
+        return pd.DataFrame(values, index=dates[first:last], columns=list(symbols), copy=False)
+
+    def update(self, fetcher, symbols, start=None, end=None):
+        # Fetches only what the store lacks: the bars after the last stored date for known
+        # symbols, the history before what they cover when start reaches further back (None:
+        # all of it), and the full [start, end] history for symbols the store has not seen yet.
+        source = getattr(fetcher, "source", None)
+        self.check_source(source)
+        symbols = list(symbols)
+        stored = self.load().copy() if self.exists() else pd.DataFrame()
+        meta = self._meta()
+        # Stores written before coverage was recorded cover their first stored date onwards
+        first_date = stored.index[0].isoformat() if len(stored.index) else None
+        coverage = {s: meta.get("coverage", {}).get(s, first_date) for s in stored.columns}
+        new_symbols = [s for s in symbols if s not in stored.columns]
+        known_symbols = [s for s in symbols if s in stored.columns]
+        backfill_symbols = [s for s in known_symbols if _starts_before(start, coverage[s])]
+        fetched = []
+
+        if new_symbols:
+            fetched.append(fetcher(new_symbols, start, end))
+
+        for covered in sorted({coverage[s] for s in backfill_symbols}):
+            group = [s for s in backfill_symbols if coverage[s] == covered]
+            earlier = fetcher(group, start, pd.Timestamp(covered) - pd.Timedelta(days=1))
+            fetched.append(earlier.loc[earlier.index < pd.Timestamp(covered)])
+        requested = None if start is None else pd.Timestamp(start).isoformat()
+        coverage.update({s: requested for s in new_symbols + backfill_symbols})
+        meta = {"source": source if source is not None else meta.get("source"), "coverage": coverage}
+
+        if known_symbols and len(stored.index):
+            after = stored.index[-1] + pd.Timedelta(days=1)
+            if end is None or after <= pd.Timestamp(end):
+                appended = fetcher(known_symbols, after, end)
+                fetched.append(appended.loc[appended.index > stored.index[-1]])
+
+        fetched = [frame for frame in fetched if not frame.empty]
+        if not fetched:
+            if self.exists():
+                # Nothing new, but the store is now known to be current: bump modified_time() so
+                # callers comparing source mtimes against it do not re-import on every run
+                self._write_meta(meta)
+                os.utime(self._path("closes"))
+            return self.load() if self.exists() else stored
+
+        # New symbols overlap stored dates, so frames are merged rather than appended
+        merged = stored
+        for frame in fetched:
+            merged = frame if merged.empty else merged.combine_first(frame)
+        columns = list(stored.columns) + [s for s in symbols if s in merged.columns and s not in stored.columns]
+        self._write(merged[columns].sort_index(), meta)
+        return self.load()
+
+    def _write_meta(self, meta):
+        path = os.path.join(self.store_dir, "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _write(self, prices, meta):
+        os.makedirs(self.store_dir, exist_ok=True)
+        arrays = {
+            "closes": np.ascontiguousarray(prices.to_numpy(dtype=np.float64)),
+            "dates": prices.index.to_numpy(dtype="datetime64[ns]"),
+            "symbols": np.array([str(s) for s in prices.columns]),
+        }
+        # Write everything to temporaries first, then swap in, so readers never see a half-written array
+        for name, array in arrays.items():
+            with open(self._path(name) + ".tmp", "wb") as f:
+                np.save(f, array)
+        for name in ("symbols", "dates", "closes"):
+            os.replace(self._path(name) + ".tmp", self._path(name))
+        self._write_meta(meta)
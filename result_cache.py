@@ -0,0 +1,123 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_VERSION = 2  # Bump when cached result layouts change so older entries are never returned
+
+def _update_hash(h, value):
+    # Feeds a canonical byte representation of value into h; arrays and frames hash their contents
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(type(value).__name__.encode())
+        _update_hash(h, value.to_numpy())
+        _update_hash(h, value.index.to_numpy())
+        if isinstance(value, pd.DataFrame):
+            _update_hash(h, value.columns.to_numpy())
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update(f"ndarray{value.dtype.str}{value.shape}".encode())
+        h.update(value.tobytes() if value.dtype != object else repr([str(item) for item in value.ravel()]).encode())
+    elif isinstance(value, dict):
+        h.update(b"dict")
+        for key in sorted(value, key=str):
+            _update_hash(h, str(key))
+            _update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_hash(h, item)
+    else:
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+
+def cache_key(*parts, **named):
+    # SHA-256 over the inputs of a run (return matrix, weights, horizon, path count, model,
+    # seed, ...); any change to the data or parameters gives a new key
+    h = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    _update_hash(h, list(parts))
+    _update_hash(h, named)
+    return h.hexdigest()
+
+class ResultCache:
+    # Content-addressed on-disk cache. Each entry is a directory named by its key holding the
+    # pickled reduced result and, optionally, arrays as .npy files (loaded lazily as memmaps).
+    # Entries are written to a temporary directory and renamed into place, and the least
+    # recently used ones are evicted once the cache grows past max_bytes.
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._entry(key), "result.pkl"))
+
+    def get(self, key, default=None):
+        # (result, {name: array}) for a stored key, or default
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, "result.pkl"), "rb") as f:
+                result = pickle.load(f)
+            arrays = {name[:-4]: np.load(os.path.join(entry, name), mmap_mode="r")
+                      for name in os.listdir(entry) if name.endswith(".npy")}
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+        os.utime(entry)  # Mark as recently used
+        return result, arrays
+
+    def put(self, key, result, arrays=None):
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            with open(os.path.join(tmp, "result.pkl"), "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, array in (arrays or {}).items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+            if os.path.exists(self._entry(key)):
+                shutil.rmtree(self._entry(key))
+            os.replace(tmp, self._entry(key))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        # compute() returns (result, arrays) on a miss; returns the cached pair on a hit
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result, arrays = compute()
+        self.put(key, result, arrays)
+        return result, arrays or {}
+
+    def entries(self):
+        # [(key, bytes, last used)] for every complete entry, least recently used first
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry = self._entry(key)
+            if key.startswith(".tmp-") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            entries.append((key, size, os.path.getmtime(entry)))
+        return sorted(entries, key=lambda e: e[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        self.evict(max_bytes=0)
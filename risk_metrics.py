@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def path_risk_metrics(paths, initial_value, floor=None, time_axis=0):
+    # Per-path risk metrics of a block of value paths, in one vectorized pass over the block.
+    # Paths start after the first step, so initial_value counts as the opening peak. Returns
+    # (n_paths,) arrays:
+    #   max_drawdown      - worst fall from a running peak, as a (negative) fraction of that peak
+    #   time_under_water  - fraction of steps spent below the running peak
+    #   longest_under_water - longest run of consecutive steps below the running peak
+    #   terminal_return   - final value / initial_value - 1
+    #   worst_return      - lowest value anywhere on the path / initial_value - 1
+    #   breached_floor    - whether the path ever closed below floor (only when floor is given)
+    paths = np.asarray(paths)
+    if time_axis != 0:
+        paths = np.moveaxis(paths, time_axis, 0)
+    peaks = np.maximum(np.maximum.accumulate(paths, axis=0), initial_value)
+    drawdowns = paths / peaks - 1
+    under_water = drawdowns < 0
+
+    # Length of the current underwater spell: steps since the last step at a peak
+    spell_steps = np.cumsum(under_water, axis=0)
+    spell_start = np.maximum.accumulate(np.where(under_water, 0, spell_steps), axis=0)
+    path_minimum = paths.min(axis=0)
+
+    metrics = {
+        "max_drawdown": drawdowns.min(axis=0),
+        "time_under_water": under_water.mean(axis=0),
+        "longest_under_water": (spell_steps - spell_start).max(axis=0),
+        "terminal_return": paths[-1] / initial_value - 1,
+        "worst_return": path_minimum / initial_value - 1,
+    }
+    if floor is not None:
+        metrics["breached_floor"] = path_minimum < floor
+    return metrics
+
+def value_at_risk(returns, level=0.95):
+    # Loss (as a positive fraction) not exceeded with probability level
+    return -np.percentile(returns, 100 * (1 - level))
+
+def conditional_value_at_risk(returns, level=0.95):
+    # Mean loss over the worst 1 - level share of outcomes (expected shortfall)
+    returns = np.sort(np.asarray(returns))
+    tail = returns[:max(1, int(np.ceil(len(returns) * (1 - level))))]
+    return -tail.mean()
+
+class RiskAccumulator:
+    # Collects per-path risk metrics block by block, so they can be fed from a chunked simulation
+    # loop (or a pass over stored paths) without ever holding the full path matrix. Only the
+    # per-path scalars are kept, so the summary distributions are exact.
+    def __init__(self, initial_value, floor=None, time_axis=0):
+        self.initial_value = initial_value
+        self.floor = floor
+        self.time_axis = time_axis
+        self._blocks = []
+
+    def update(self, paths):
+        self._blocks.append(path_risk_metrics(paths, self.initial_value, self.floor, self.time_axis))
+
+    def metrics(self):
+        # Per-path metric arrays over every path seen so far
+        return {key: np.concatenate([block[key] for block in self._blocks]) for key in self._blocks[0]}
+
+    def summary(self, levels=(0.95, 0.99), percentiles=(5, 50, 95)):
+        metrics = self.metrics()
+        summary = {"paths": len(metrics["terminal_return"])}
+        for key in ("max_drawdown", "time_under_water", "longest_under_water"):
+            summary[key] = dict(zip(percentiles, np.percentile(metrics[key], percentiles)))
+        for level in levels:
+            summary[f"terminal_var_{level:g}"] = value_at_risk(metrics["terminal_return"], level)
+            summary[f"terminal_cvar_{level:g}"] = conditional_value_at_risk(metrics["terminal_return"], level)
+            summary[f"path_var_{level:g}"] = value_at_risk(metrics["worst_return"], level)
+            summary[f"path_cvar_{level:g}"] = conditional_value_at_risk(metrics["worst_return"], level)
+        if self.floor is not None:
+            summary["floor_breach_probability"] = metrics["breached_floor"].mean()
+        return summary
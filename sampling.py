@@ -0,0 +1,137 @@
+import warnings
+from collections import deque
+
+import numpy as np
+
+
+SCHEMES = ("plain", "antithetic", "sobol")
+SOBOL_MAX_DIMS = 21201  # Largest dimension scipy ships direction numbers for
+
+def bridge_schedule(n_steps):
+    # Brownian-bridge fill order over W_1..W_n (W_0 = 0): the first normal sets the endpoint,
+    # the rest fill midpoints level by level. Each entry is (point, left, right, w_left, w_right, std).
+    schedule = [(n_steps, 0, 0, 0.0, 0.0, np.sqrt(n_steps))]
+    intervals = deque([(0, n_steps)])
+    while intervals:
+        left, right = intervals.popleft()
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        span = right - left
+        schedule.append((mid, left, right, (right - mid) / span, (mid - left) / span,
+                         np.sqrt((mid - left) * (right - mid) / span)))
+        intervals.extend([(left, mid), (mid, right)])
+    return schedule
+
+def brownian_bridge(Z, schedule=None):
+    # Maps (paths, n_steps, dims) normals in bridge order to iid unit-variance increments,
+    # so the leading (most uniform) quasi-random coordinates drive the coarse path shape.
+    n_steps = Z.shape[1]
+    schedule = bridge_schedule(n_steps) if schedule is None else schedule
+    W = np.zeros((Z.shape[0], n_steps + 1) + Z.shape[2:])
+    for k, (point, left, right, w_left, w_right, std) in enumerate(schedule):
+        W[:, point] = w_left * W[:, left] + w_right * W[:, right] + std * Z[:, k]
+    return np.diff(W, axis=1)
+
+def replicate_labels(n_paths, scheme="plain", replicates=8):
+    # Independent replicate group of each path: antithetic pairs stay together and
+    # each Sobol replicate is its own scramble
+    index = np.arange(n_paths)
+    if scheme == "antithetic":
+        index = index // 2
+    return index % replicates
+
+
+class NormalSampler:
+    # Standard normals of shape (paths, n_steps, n_dims) under a sampling scheme:
+    #   plain      - pseudo-random rng.standard_normal
+    #   antithetic - consecutive paths (2i, 2i + 1) are Z and -Z
+    #   sobol      - scrambled Sobol points through the inverse normal CDF with Brownian-bridge
+    #                construction over the steps; one independent scramble per replicate group
+    # State carries over between draw() calls, so drawing in blocks gives the same paths as one draw.
+    # dtype=np.float32 halves the memory of every block (Sobol points are still computed in float64).
+
+    def __init__(self, scheme, n_steps, n_dims, rng=None, replicates=8, dtype=np.float64):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown sampling scheme '{scheme}', expected one of {SCHEMES}")
+        self.scheme = scheme
+        self.n_steps = n_steps
+        self.n_dims = n_dims
+        self.rng = np.random.default_rng(rng)
+        self.replicates = replicates
+        self.dtype = np.dtype(dtype)
+        self.drawn = 0
+        self._pending = None
+
+        if scheme == "sobol":
+            from scipy.stats import qmc
+
+            self._sobol_dims = min(n_steps * n_dims, SOBOL_MAX_DIMS)
+            self._engines = [qmc.Sobol(self._sobol_dims, scramble=True, seed=self.rng) for _ in range(replicates)]
+            self._schedule = bridge_schedule(n_steps)
+
+    def draw(self, n_paths):
+        if self.scheme == "antithetic":
+            Z = self._antithetic(n_paths)
+        elif self.scheme == "sobol":
+            Z = self._sobol(n_paths).astype(self.dtype, copy=False)
+        else:
+            Z = self.rng.standard_normal(size=(n_paths, self.n_steps, self.n_dims), dtype=self.dtype)
+        self.drawn += n_paths
+        return Z
+
+    def labels(self, n_paths=None):
+        return replicate_labels(self.drawn if n_paths is None else n_paths, self.scheme, self.replicates)
+
+    def _antithetic(self, n_paths):
+        Z = np.empty(shape=(n_paths, self.n_steps, self.n_dims), dtype=self.dtype)
+        first = 0
+        if self._pending is not None and n_paths:
+            Z[0] = -self._pending
+            self._pending = None
+            first = 1
+
+        base = self.rng.standard_normal(size=((n_paths - first + 1) // 2, self.n_steps, self.n_dims), dtype=self.dtype)
+        pairs = np.stack([base, -base], axis=1).reshape((-1, self.n_steps, self.n_dims))
+        Z[first:] = pairs[:n_paths - first]
+        if (n_paths - first) % 2:
+            self._pending = base[-1]
+        return Z
+
+    def _sobol(self, n_paths):
+        from scipy.special import ndtri
+
+        total_dims = self.n_steps * self.n_dims
+        flat = np.empty(shape=(n_paths, total_dims))
+        groups = replicate_labels(self.drawn + n_paths, "sobol", self.replicates)[self.drawn:]
+        with warnings.catch_warnings():
+            # Point counts are not powers of two in general; balance is traded for block-size freedom
+            warnings.simplefilter("ignore", UserWarning)
+            for r, engine in enumerate(self._engines):
+                rows = np.flatnonzero(groups == r)
+                if len(rows):
+                    u = np.clip(engine.random(len(rows)), 1e-12, 1 - 1e-12)
+                    flat[rows, :self._sobol_dims] = ndtri(u)
+
+        # Dimensions past scipy's limit are padded with pseudo-random normals; in bridge order
+        # they only drive the finest path detail
+        if total_dims > self._sobol_dims:
+            flat[:, self._sobol_dims:] = self.rng.standard_normal(size=(n_paths, total_dims - self._sobol_dims))
+
+        return brownian_bridge(flat.reshape((n_paths, self.n_steps, self.n_dims)), self._schedule)
+
+
+def estimate(values, statistic=np.mean, labels=None, replicates=8):
+    # Statistic over all paths plus its standard error from the spread across replicate groups
+    values = np.asarray(values)
+    labels = replicate_labels(len(values), replicates=replicates) if labels is None else labels
+    group_stats = np.array([statistic(values[labels == r]) for r in np.unique(labels)])
+    return statistic(values), np.std(group_stats, ddof=1) / np.sqrt(len(group_stats))
+
+def control_variate(values, control, control_mean):
+    # values - b (control - E[control]) with the variance-minimizing b; same mean as values
+    values = np.asarray(values, dtype=float)
+    control = np.asarray(control, dtype=float)
+    centered = control - control.mean()
+    b = np.dot(centered, values - values.mean()) / np.dot(centered, centered)
+    return values - b * (control - control_mean)
@@ -0,0 +1,253 @@
+# Long-running local simulation service.
+#
+# Loads the ETF prices and fits the return statistics once, keeps a process pool whose workers
+# hold those statistics, and serves simulation requests as newline-delimited JSON over a
+# localhost TCP socket. Each job is split into batches of paths that run concurrently on the
+# pool; a progress message with the percentiles so far is streamed back after every batch.
+#
+#     python service.py serve --port 8765
+#     python service.py request --port 8765 --mc-sims 100000 --T 365
+#
+# Request:  {"id": ..., "weights": [...], "T": 365, "mc_sims": 10000, "initial_portfolio": 100000,
+#            "expected_gain": 1.1, "percentiles": [10, 25, 50, 75, 90], "seed": 42, "scheme": "plain"}
+#           or {"op": "info"}
+# Replies:  {"id": ..., "type": "queued" | "progress" | "result" | "error", ...}, one per line
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from market_data import MarketData
+from parallel import default_workers
+from pie import DATA_DIR, PRICE_STORE_DIR, load_etf_data, monte_carlo_simulation
+from sampling import SCHEMES
+
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+_worker_state = {}
+
+def _init_worker(meanReturns, covMatrix, cholesky):
+    # Runs once per pool process, so requests only ship weights and sizes
+    _worker_state.update(meanReturns=meanReturns, covMatrix=covMatrix, cholesky=cholesky)
+
+def _simulate_batch(weights, T, n_paths, initialPortfolio, seed_sequence, scheme):
+    # Terminal values and path minima of one batch of paths
+    sims = monte_carlo_simulation(_worker_state["meanReturns"], _worker_state["covMatrix"], weights, T, n_paths,
+                                  initialPortfolio, seed=np.random.default_rng(seed_sequence), scheme=scheme,
+                                  cholesky=_worker_state["cholesky"])
+    return sims[-1], sims.min(axis=0)
+
+class SimulationService:
+    # Warm model state plus a job queue. Up to max_jobs jobs run at a time; their batches share
+    # the pool, at most one per worker in flight. Each job only submits a new batch when one of its
+    # own finishes (at most `workers` outstanding), so a job's next batch queues behind the batches
+    # other jobs already submitted and concurrent jobs interleave instead of running job after job.
+    def __init__(self, data_dir=DATA_DIR, store_dir=PRICE_STORE_DIR, workers=None, batch_size=5000, max_jobs=4):
+        etf_data, self.stock_list = load_etf_data(data_dir, store_dir)
+        self.market = MarketData(etf_data)
+        self.market.cholesky()  # Fail at startup, not on the first request, if the fit is unusable
+        self.workers = workers or default_workers()
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.market.mean_returns(), self.market.covariance(),
+                                                  self.market.cholesky()))
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._job_ids = itertools.count(1)
+
+    def info(self):
+        return {"type": "info", "symbols": self.stock_list, "days": len(self.market.index),
+                "workers": self.workers, "batch_size": self.batch_size, "queued": self.queue.qsize()}
+
+    async def _run_batch(self, *args):
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, _simulate_batch, *args)
+
+    def parse_request(self, request):
+        # Checks a simulation request and fills in the defaults; raises ValueError with a message
+        # for the client, before the job is queued
+        weights = request.get("weights")
+        if weights is None:
+            weights = np.full(len(self.stock_list), 1 / len(self.stock_list))
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (len(self.stock_list),):
+            raise ValueError(f"Expected {len(self.stock_list)} weights for {self.stock_list}")
+        if not np.all(np.isfinite(weights)) or weights.sum() <= 0:
+            raise ValueError("Weights must be finite and sum to a positive number")
+        job = {"weights": weights / weights.sum(), "T": int(request.get("T", 365)),
+               "mc_sims": int(request.get("mc_sims", 10000)),
+               "initial_portfolio": float(request.get("initial_portfolio", 100000)),
+               "expected_gain": float(request.get("expected_gain", 1.1)),
+               "percentiles": [float(p) for p in request.get("percentiles", [10, 25, 50, 75, 90])],
+               "seed": request.get("seed"), "scheme": request.get("scheme", "plain")}
+        if job["T"] <= 0 or job["mc_sims"] <= 0:
+            raise ValueError("T and mc_sims must be positive")
+        if not job["initial_portfolio"] > 0:
+            raise ValueError("initial_portfolio must be positive")
+        if not all(0 <= p <= 100 for p in job["percentiles"]):
+            raise ValueError("Percentiles must be between 0 and 100")
+        if job["scheme"] not in SCHEMES:
+            raise ValueError(f"Unknown sampling scheme '{job['scheme']}', expected one of {SCHEMES}")
+        return job
+
+    async def run_job(self, job, send):
+        # Simulates one parsed request batch by batch, sending the running percentiles after each
+        # batch. Batches draw from SeedSequence children, so a seed gives the same paths however the
+        # batches are scheduled.
+        weights, T, mc_sims, scheme = job["weights"], job["T"], job["mc_sims"], job["scheme"]
+        initialPortfolio = job["initial_portfolio"]
+        target = initialPortfolio * job["expected_gain"]
+        percentiles = job["percentiles"]
+
+        sizes = [min(self.batch_size, mc_sims - start) for start in range(0, mc_sims, self.batch_size)]
+        seeds = np.random.SeedSequence(job["seed"]).spawn(len(sizes))
+        final_values, minima = [], []
+
+        def statistics():
+            values = np.concatenate(final_values)
+            return {"paths": len(values), "percentiles": dict(zip(map(str, percentiles), np.percentile(values, percentiles))),
+                    "failure_rate": np.mean(values < target) * 100,
+                    "ruin_rate": np.mean(np.concatenate(minima) <= 0) * 100}
+
+        batches = iter(zip(sizes, seeds))
+        running = set()
+        try:
+            while True:
+                for size, seed in itertools.islice(batches, self.workers - len(running)):
+                    running.add(asyncio.ensure_future(self._run_batch(weights, T, size, initialPortfolio, seed, scheme)))
+                if not running:
+                    break
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for batch in done:
+                    values, path_minima = batch.result()
+                    final_values.append(values)
+                    minima.append(path_minima)
+                if len(final_values) < len(sizes):
+                    await send({"type": "progress", **statistics()})
+        finally:
+            for batch in running:
+                batch.cancel()
+        await send({"type": "result", "mean": float(np.mean(np.concatenate(final_values))), **statistics()})
+
+    async def _job_runner(self):
+        while True:
+            job, send, done = await self.queue.get()
+            try:
+                await self.run_job(job, send)
+            except ConnectionError:
+                pass  # The client went away; drop the job
+            except Exception as error:
+                await send({"type": "error", "error": str(error)})
+            finally:
+                done.set()
+                self.queue.task_done()
+
+    async def handle_connection(self, reader, writer):
+        # One JSON request per line; replies for concurrent requests on a connection are tagged by id
+        lock = asyncio.Lock()
+        pending = []
+
+        def sender(job_id):
+            async def send(message):
+                async with lock:
+                    writer.write((json.dumps({"id": job_id, **message}, default=_to_json) + "\n").encode())
+                    await writer.drain()
+            return send
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as error:
+                    await sender(None)({"type": "error", "error": f"Invalid JSON: {error}"})
+                    continue
+                job_id = request.get("id", next(self._job_ids))
+                if request.get("op", "simulate") == "info":
+                    await sender(job_id)(self.info())
+                    continue
+                try:
+                    job = self.parse_request(request)
+                except (TypeError, ValueError) as error:
+                    await sender(job_id)({"type": "error", "error": str(error)})
+                    continue
+                done = asyncio.Event()
+                await sender(job_id)({"type": "queued", "position": self.queue.qsize() + 1})
+                await self.queue.put((job, sender(job_id), done))
+                pending.append(done)
+            # The client closed its side; finish its outstanding jobs before closing ours
+            await asyncio.gather(*(done.wait() for done in pending))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        runners = [asyncio.create_task(self._job_runner()) for _ in range(self.max_jobs)]
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving {len(self.stock_list)} ETFs on {host}:{port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for runner in runners:
+                runner.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+async def request_simulation(request, host=HOST, port=PORT, on_message=print):
+    # Test client: sends one request, calls on_message for every reply and returns the final one
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        writer.write_eof()
+        message = None
+        while line := await reader.readline():
+            message = json.loads(line)
+            on_message(message)
+            if message["type"] in ("result", "error", "info"):
+                break
+        return message
+    finally:
+        writer.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Monte Carlo simulation service and test client")
+    parser.add_argument("command", choices=["serve", "request", "info"])
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--mc-sims", type=int, default=10000)
+    parser.add_argument("--T", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--weights", type=float, nargs="+", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        async def serve():
+            service = SimulationService(args.data_dir, os.path.join(args.data_dir, "store", "csv"), workers=args.workers,
+                                        batch_size=args.batch_size)
+            await service.serve(port=args.port)
+        asyncio.run(serve())
+    elif args.command == "info":
+        asyncio.run(request_simulation({"op": "info"}, port=args.port))
+    else:
+        asyncio.run(request_simulation({"T": args.T, "mc_sims": args.mc_sims, "seed": args.seed, "weights": args.weights},
+                                       port=args.port))
+
+
+if __name__ == "__main__":
+    main()